@@ -0,0 +1,183 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+HASH_SIZE = 8
+# Near-duplicate thresholds in differing bits out of 64. pHash finds candidates and
+# dHash confirms them, re-encodes and resizes usually land well inside both.
+MAX_PHASH_DISTANCE = 8
+MAX_DHASH_DISTANCE = 10
+
+_DCT_SIZE = HASH_SIZE * 4
+# DCT-II basis, so a 2D DCT is two matrix products
+_DCT = np.cos(
+    np.pi
+    * (2 * np.arange(_DCT_SIZE)[None, :] + 1)
+    * np.arange(_DCT_SIZE)[:, None]
+    / (2 * _DCT_SIZE)
+)
+
+
+@dataclass
+class DedupReport:
+    images: int = 0
+    clusters: int = 0
+    seconds: float = 0.0
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def duplicates(self) -> int:
+        return self.images - self.clusters
+
+    def savings(self, embed_seconds_per_image: float, dim: int) -> str:
+        # Every duplicate is an embedding not computed and a vector not indexed
+        return (
+            f"Dedup: {self.images} images in {self.clusters} clusters, "
+            f"{self.duplicates} near-duplicates skipped in {self.seconds:.1f}s, saving "
+            f"~{self.duplicates * embed_seconds_per_image:.1f}s of embedding and "
+            f"{self.duplicates * dim * 4 / 1024:.0f} KiB of float32 vectors"
+        )
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for radius search in Hamming space."""
+
+    def __init__(self):
+        self.root = None  # (hash, item, {distance: child})
+
+    def add(self, value: int, item) -> None:
+        node = (value, item, {})
+        if self.root is None:
+            self.root = node
+            return
+
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, object]]:
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.append((distance, item))
+            # Triangle inequality: only children within radius of distance can match
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return sorted(found, key=lambda match: match[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def perceptual_hashes(path: str) -> Tuple[int, int, int]:
+    """(pHash, dHash, pixel count) of an image, decoded at reduced scale."""
+    from PIL import Image  # Deferred, only needed at ingest
+
+    with Image.open(path) as img:
+        pixels = img.size[0] * img.size[1]
+        img.draft("L", (_DCT_SIZE * 2, _DCT_SIZE * 2))
+        gray = img.convert("L")
+
+    small = np.asarray(
+        gray.resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS), dtype=np.float64
+    )
+    low = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    phash = _to_int(low > np.median(low[1:]))
+
+    gradient = np.asarray(
+        gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16
+    )
+    dhash = _to_int((gradient[:, 1:] > gradient[:, :-1]).flatten())
+    return phash, dhash, pixels
+
+
+def find_near_duplicates(
+    paths: Iterable[str],
+    max_workers: Optional[int] = None,
+    max_phash_distance: int = MAX_PHASH_DISTANCE,
+    max_dhash_distance: int = MAX_DHASH_DISTANCE,
+    report: Optional[DedupReport] = None,
+) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Cluster near-duplicate images (re-encodes, resizes) by perceptual hash. Hashes are
+    computed on a thread pool, clusters are found with a BK-tree over pHash. Returns
+    one representative per cluster, the highest-resolution member, and the other
+    members of each cluster keyed by their representative.
+    """
+    report = report if report is not None else DedupReport()
+    start = time.perf_counter()
+
+    tree = BKTree()
+    clusters: List[List[tuple]] = []  # Members as (pixels, path)
+    for path, hashes, error in _hash_all(paths, max_workers):
+        report.images += 1
+        if error is not None:
+            # Left to ingest, which records why it can't be read
+            report.errors[path] = error
+            clusters.append([(0, path)])
+            continue
+
+        phash, dhash, pixels = hashes
+        cluster = next(
+            (
+                index
+                for _, (index, cluster_dhash) in tree.search(phash, max_phash_distance)
+                if hamming(dhash, cluster_dhash) <= max_dhash_distance
+            ),
+            None,
+        )
+        if cluster is None:
+            cluster = len(clusters)
+            clusters.append([])
+            tree.add(phash, (cluster, dhash))
+        clusters[cluster].append((pixels, path))
+
+    representatives, aliases = [], {}
+    for members in clusters:
+        members.sort(key=lambda member: member[0], reverse=True)
+        representative = members[0][1]
+        representatives.append(representative)
+        if len(members) > 1:
+            aliases[representative] = [path for _, path in members[1:]]
+
+    report.clusters = len(clusters)
+    report.seconds = time.perf_counter() - start
+    return representatives, aliases
+
+
+def _hash_all(paths: Iterable[str], max_workers: Optional[int]) -> Iterator[tuple]:
+    with ThreadPoolExecutor(max_workers) as executor:
+        batch = []
+        for path in paths:
+            batch.append(path)
+            if len(batch) == 256:
+                yield from executor.map(_hash_one, batch)
+                batch = []
+        yield from executor.map(_hash_one, batch)
+
+
+def _hash_one(path: str):
+    try:
+        return path, perceptual_hashes(path), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def _to_int(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
@@ -0,0 +1,314 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the cache is safe for one process only
+    fcntl = None
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_DIR = "./.embedding_cache"
+
+
+class EmbeddingCache:
+    """
+    Content-addressed store of embeddings keyed by (model id, sha256 of the input).
+
+    Vectors live in a memory-mapped float32 block per model, SQLite maps each key to its
+    row in that block and tracks when it was last used. Once `max_entries` rows are taken,
+    the least recently used rows are reused for new entries.
+
+    Several processes can share a cache directory: writers hold an exclusive lock on
+    it while they allocate slots and fill them, readers a shared one.
+    """
+
+    def __init__(self, cache_dir: str, model_id: str, max_entries: int = 100_000):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # One descriptor per instance, flock locks of separate descriptors exclude
+        # each other even within a process
+        self._lock_file = open(os.path.join(cache_dir, "embeddings.lock"), "a")
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, "embeddings.sqlite"), check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "model TEXT, digest TEXT, slot INTEGER, last_used REAL, "
+            "PRIMARY KEY (model, digest))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_lru ON entries (model, last_used)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blocks (model TEXT PRIMARY KEY, dim INTEGER)"
+        )
+        self._db.commit()
+
+        self._vectors: Optional[np.memmap] = None
+        with self._lock, self._file_lock(exclusive=True):
+            self._load_block()
+            # max_entries may have been lowered since the block was filled
+            if self._vectors is not None and self._count() > self.max_entries:
+                self._shrink()
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        digests = [self.digest(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        with self._lock, self._file_lock(exclusive=False):
+            if self._vectors is None:
+                self._load_block()  # Another process may have created it since
+            slots = self._lookup(digests) if self._vectors is not None else {}
+            for i, digest in enumerate(digests):
+                slot = slots.get(digest)
+                if slot is not None:
+                    results[i] = np.array(self._vectors[slot])
+
+            if slots:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE entries SET last_used = ? WHERE model = ? AND digest = ?",
+                    [(now, self.model_id, digest) for digest in slots],
+                )
+                self._db.commit()
+
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(texts) - hits
+        return results
+
+    def put_many(
+        self, texts: Sequence[str], vectors: Sequence[Sequence[float]]
+    ) -> None:
+        # Deduplicate, and never insert more than fits in the block
+        entries = dict(zip((self.digest(text) for text in texts), vectors))
+        entries = dict(list(entries.items())[-self.max_entries :])
+        if not entries:
+            return
+
+        with self._lock, self._file_lock(exclusive=True):
+            if self._vectors is None:
+                self._load_block()
+            if self._vectors is None:
+                dim = len(next(iter(entries.values())))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO blocks (model, dim) VALUES (?, ?)",
+                    (self.model_id, dim),
+                )
+                self._open_block(dim)
+
+            existing = self._lookup(list(entries))
+            new_digests = [digest for digest in entries if digest not in existing]
+            slots = dict(existing)
+            slots.update(
+                zip(new_digests, self._allocate(len(new_digests), keep=existing))
+            )
+
+            for digest, slot in slots.items():
+                self._vectors[slot] = np.asarray(entries[digest], dtype=np.float32)
+            self._vectors.flush()
+
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries (model, digest, slot, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                [(self.model_id, digest, slot, now) for digest, slot in slots.items()],
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model_id": self.model_id,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _load_block(self) -> None:
+        row = self._db.execute(
+            "SELECT dim FROM blocks WHERE model = ?", (self.model_id,)
+        ).fetchone()
+        if row:
+            self._open_block(row[0])
+
+    def _shrink(self) -> None:
+        # Keep the most recently used max_entries rows, moved into the first
+        # max_entries slots so slots stay dense
+        kept = self._db.execute(
+            "SELECT digest, slot FROM entries WHERE model = ? "
+            "ORDER BY last_used DESC LIMIT ?",
+            (self.model_id, self.max_entries),
+        ).fetchall()
+        taken = {slot for _, slot in kept if slot < self.max_entries}
+        free = (slot for slot in range(self.max_entries) if slot not in taken)
+
+        moves = [
+            (digest, slot, next(free)) for digest, slot in kept if slot not in taken
+        ]
+        for _, old, new in moves:
+            self._vectors[new] = self._vectors[old]
+        self._vectors.flush()
+
+        kept_digests = {digest for digest, _ in kept}
+        dropped = [
+            (self.model_id, digest)
+            for (digest,) in self._db.execute(
+                "SELECT digest FROM entries WHERE model = ?", (self.model_id,)
+            ).fetchall()
+            if digest not in kept_digests
+        ]
+        self._db.executemany(
+            "DELETE FROM entries WHERE model = ? AND digest = ?", dropped
+        )
+        self._db.executemany(
+            "UPDATE entries SET slot = ? WHERE model = ? AND digest = ?",
+            [(new, self.model_id, digest) for digest, _, new in moves],
+        )
+        self._db.commit()
+
+    def _open_block(self, dim: int) -> None:
+        name = hashlib.sha256(self.model_id.encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(self.cache_dir, f"{name}.f32")
+
+        # Grow the block if max_entries was raised since it was created
+        size = self.max_entries * dim * np.dtype(np.float32).itemsize
+        if not os.path.exists(path) or os.path.getsize(path) < size:
+            with open(path, "ab") as f:
+                f.truncate(size)
+
+        rows = os.path.getsize(path) // (dim * np.dtype(np.float32).itemsize)
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, dim))
+
+    def _lookup(self, digests: List[str]) -> dict:
+        slots = {}
+        # Stay under SQLite's bound parameter limit
+        for start in range(0, len(digests), 500):
+            batch = digests[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            slots.update(
+                self._db.execute(
+                    f"SELECT digest, slot FROM entries "
+                    f"WHERE model = ? AND digest IN ({placeholders})",
+                    [self.model_id, *batch],
+                ).fetchall()
+            )
+        return slots
+
+    def _count(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM entries WHERE model = ?", (self.model_id,)
+        ).fetchone()[0]
+
+    def _allocate(self, n: int, keep: dict) -> List[int]:
+        # Slots are handed out densely, so the next free one is the current entry count
+        count = self._count()
+        free = min(n, max(self.max_entries - count, 0))
+        slots = list(range(count, count + free))
+
+        if n > free:
+            # Entries being rewritten by this batch must not be evicted to make room for it
+            candidates = self._db.execute(
+                "SELECT digest, slot FROM entries WHERE model = ? "
+                "ORDER BY last_used LIMIT ?",
+                (self.model_id, n - free + len(keep)),
+            ).fetchall()
+            evicted = [entry for entry in candidates if entry[0] not in keep]
+            evicted = evicted[: n - free]
+            self._db.executemany(
+                "DELETE FROM entries WHERE model = ? AND digest = ?",
+                [(self.model_id, digest) for digest, _ in evicted],
+            )
+            slots.extend(slot for _, slot in evicted)
+        return slots
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedding model so repeated inputs are served from an EmbeddingCache."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_id: str,
+        cache_dir: str = EMBEDDING_CACHE_DIR,
+        max_entries: int = 100_000,
+    ):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        # Some models embed queries differently from documents, keep them apart
+        self.document_cache = EmbeddingCache(cache_dir, model_id, max_entries)
+        self.query_cache = EmbeddingCache(cache_dir, f"{model_id}#query", max_entries)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.document_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.document_cache.put_many([texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+
+        return [vector.tolist() for vector in vectors]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Batched queries go to the query cache, so a large query run can't evict
+        # document vectors. Misses are embedded with embed_query, the vectors embed_query
+        # reads back from the same cache must be query-mode ones.
+        vectors = self.query_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            computed = [self.embeddings.embed_query(texts[i]) for i in missing]
+            self.query_cache.put_many([texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.query_cache.get_many([text])[0]
+        if vector is None:
+            computed = self.embeddings.embed_query(text)
+            self.query_cache.put_many([text], [computed])
+            return computed
+        return vector.tolist()
+
+    def stats(self) -> dict:
+        return {
+            "documents": self.document_cache.stats(),
+            "queries": self.query_cache.stats(),
+        }
@@ -0,0 +1,206 @@
+import glob
+import json
+import os
+from typing import Iterable, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+
+from rag_common.dedup import DedupReport, find_near_duplicates
+from rag_common.embedding_cache import CachedEmbeddings
+from rag_common.image_store import PACK_FILE, ImageIngestReport, _batched, ingest_images
+from rag_common.local_models import hashing_embeddings_from_env, use_hashing_embeddings
+
+SHARD_DIR = "./image_store/shards"
+MANIFEST_FILE = "manifest.json"
+
+
+def clip_embeddings() -> CachedEmbeddings:
+    if use_hashing_embeddings():
+        # RAG_EMBEDDINGS=hashing, for offline runs without the CLIP model
+        hashing = hashing_embeddings_from_env()
+        return CachedEmbeddings(hashing, model_id=hashing.model_id)
+
+    # Deferred, open_clip pulls in torch and torchvision
+    from langchain_experimental.open_clip import OpenCLIPEmbeddings
+
+    clip = OpenCLIPEmbeddings()
+    return CachedEmbeddings(
+        clip, model_id=f"open_clip/{clip.model_name}/{clip.checkpoint}"
+    )
+
+
+def index_images(
+    pattern: str,
+    pack_path: str = PACK_FILE,
+    batch_size: int = 32,
+    max_workers: Optional[int] = None,
+    dedup: bool = True,
+    shard_dir: Optional[str] = None,
+    shard_size: int = 1024,
+    thumbnail_cache=None,
+) -> Optional[FAISS]:
+    """
+    Embed the images matching pattern with CLIP into a FAISS store. Documents only
+    reference their image in the pack file, see image_store. With a shard_dir, the glob
+    is ingested in checkpointed shards of shard_size images and an interrupted run
+    picks up where it stopped.
+    """
+    embeddings = clip_embeddings()
+    ingest_kwargs = dict(
+        batch_size=batch_size,
+        max_workers=max_workers,
+        thumbnail_cache=thumbnail_cache,
+    )
+    if shard_dir is not None:
+        return build_image_index_in_shards(
+            pattern, embeddings, shard_dir, shard_size, dedup=dedup, **ingest_kwargs
+        )
+
+    vector_store, report, dedup_report = build_image_index(
+        glob.iglob(pattern, recursive=True),
+        embeddings,
+        pack_path,
+        dedup=dedup,
+        **ingest_kwargs,
+    )
+    print(report)
+    if dedup_report is not None and vector_store is not None:
+        print(dedup_savings(dedup_report, report, vector_store))
+    return vector_store
+
+
+def build_image_index(
+    paths: Iterable[str],
+    embeddings: CachedEmbeddings,
+    pack_path: str = PACK_FILE,
+    dedup: bool = True,
+    **ingest_kwargs,
+) -> Tuple[Optional[FAISS], ImageIngestReport, Optional[DedupReport]]:
+    """
+    Ingest images into a new FAISS store batch by batch, see image_store.ingest_images
+    for ingest_kwargs. With dedup, near-duplicates are embedded once, as aliases of
+    their cluster's representative. The store is None if no image could be read.
+    """
+    report, dedup_report, aliases = ImageIngestReport(), None, None
+    if dedup:
+        dedup_report = DedupReport()
+        paths, aliases = find_near_duplicates(
+            paths, max_workers=ingest_kwargs.get("max_workers"), report=dedup_report
+        )
+
+    vector_store = None
+    batches = ingest_images(
+        paths, embeddings, pack_path, report=report, aliases=aliases, **ingest_kwargs
+    )
+    for docs, vectors in batches:
+        text_embeddings = [
+            (doc.page_content, vector) for doc, vector in zip(docs, vectors)
+        ]
+        metadatas = [doc.metadata for doc in docs]
+        if vector_store is None:
+            vector_store = FAISS.from_embeddings(
+                text_embeddings, embeddings, metadatas=metadatas
+            )
+        else:
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+    return vector_store, report, dedup_report
+
+
+def build_image_index_in_shards(
+    pattern: str,
+    embeddings: CachedEmbeddings,
+    shard_dir: str = SHARD_DIR,
+    shard_size: int = 1024,
+    dedup: bool = True,
+    **ingest_kwargs,
+) -> Optional[FAISS]:
+    """
+    Ingest the images matching pattern shard by shard, each shard_size paths into its
+    own FAISS index and pack file under shard_dir. A shard is recorded in the manifest
+    only once its files are written, so an interrupted run resumes after the last
+    complete shard; images in flight are bounded by the shard size. The shards are
+    merged into one store at the end. Near-duplicates are only found within a shard.
+    """
+    manifest = _read_manifest(shard_dir)
+    if (
+        manifest is None
+        or manifest["pattern"] != pattern
+        or manifest["model_id"] != embeddings.model_id
+    ):
+        # Nothing to resume (or it was another glob or model), complete shards are redone
+        manifest = {"pattern": pattern, "model_id": embeddings.model_id, "shards": []}
+
+    done = set()
+    for shard in manifest["shards"]:
+        with open(os.path.join(shard_dir, shard["name"], "paths.txt")) as f:
+            done.update(f.read().splitlines())
+    if done:
+        print(
+            f"Resuming from {shard_dir}: {len(done)} images already in "
+            f"{len(manifest['shards'])} shards"
+        )
+
+    pending = (path for path in glob.iglob(pattern, recursive=True) if path not in done)
+    for paths in _batched(pending, shard_size):
+        name = f"shard_{len(manifest['shards']):05d}"
+        shard_path = os.path.join(shard_dir, name)
+        os.makedirs(shard_path, exist_ok=True)
+
+        vector_store, report, dedup_report = build_image_index(
+            paths,
+            embeddings,
+            os.path.join(shard_path, "images.pack"),
+            dedup=dedup,
+            **ingest_kwargs,
+        )
+        if vector_store is not None:
+            vector_store.save_local(shard_path)
+        # Unreadable images are listed too, they would only fail again
+        with open(os.path.join(shard_path, "paths.txt"), "w") as f:
+            f.write("".join(f"{path}\n" for path in paths))
+
+        manifest["shards"].append(
+            {"name": name, "images": report.images, "indexed": vector_store is not None}
+        )
+        _write_manifest(shard_dir, manifest)
+        print(f"{name}: {report}")
+        if dedup_report is not None and vector_store is not None:
+            print(f"{name}: {dedup_savings(dedup_report, report, vector_store)}")
+
+    vector_store = None
+    for shard in manifest["shards"]:
+        if not shard["indexed"]:
+            continue
+        shard_store = FAISS.load_local(
+            os.path.join(shard_dir, shard["name"]),
+            embeddings,
+            allow_dangerous_deserialization=True,  # Our own pickled docstore
+        )
+        if vector_store is None:
+            vector_store = shard_store
+        else:
+            vector_store.merge_from(shard_store)
+    return vector_store
+
+
+def dedup_savings(
+    dedup_report: DedupReport, report: ImageIngestReport, vector_store: FAISS
+) -> str:
+    return dedup_report.savings(
+        report.embed_seconds / max(report.images, 1), vector_store.index.d
+    )
+
+
+def _read_manifest(shard_dir: str) -> Optional[dict]:
+    manifest_path = os.path.join(shard_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _write_manifest(shard_dir: str, manifest: dict) -> None:
+    manifest_path = os.path.join(shard_dir, MANIFEST_FILE)
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
@@ -0,0 +1,323 @@
+import base64
+import hashlib
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag_common.embedding_cache import CachedEmbeddings
+
+PACK_FILE = "./image_store/images.pack"
+THUMBNAIL_SIZE = (64, 64)
+# JPEGs are decoded at the smallest 1/2, 1/4 or 1/8 scale still at least this big,
+# comfortably above CLIP's 224px input
+DRAFT_SIZE = (448, 448)
+
+
+class _LoadedImage(NamedTuple):
+    path: str
+    data: Optional[bytes] = None
+    digest: Optional[str] = None
+    mime_type: Optional[str] = None
+    thumbnail: Optional[str] = None  # base64 JPEG kept in the document metadata
+    rendered: Dict[tuple, bytes] = {}  # Prompt thumbnails for the thumbnail cache
+    tensor: Any = None  # Preprocessed for CLIP
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class ImageIngestReport:
+    images: int = 0
+    stored: int = 0  # Distinct images written to the pack
+    cached: int = 0
+    batches: int = 0
+    decode_seconds: float = 0.0  # Summed over decode threads
+    embed_seconds: float = 0.0
+    seconds: float = 0.0
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def images_per_sec(self) -> float:
+        return self.images / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"Ingested {self.images} images ({self.stored} stored, {self.cached} "
+            f"embeddings from cache, {len(self.errors)} failed) in {self.batches} "
+            f"batches, {self.seconds:.1f}s, {self.images_per_sec:.1f} images/sec "
+            f"(decode {self.decode_seconds:.1f}s across threads, "
+            f"embed {self.embed_seconds:.1f}s)"
+        )
+
+
+def ingest_images(
+    paths: Iterable[str],
+    embeddings: CachedEmbeddings,
+    pack_path: str = PACK_FILE,
+    batch_size: int = 32,
+    max_workers: Optional[int] = None,
+    report: Optional[ImageIngestReport] = None,
+    thumbnail_cache=None,
+    aliases: Optional[Dict[str, List[str]]] = None,
+) -> Iterator[Tuple[List[Document], List[List[float]]]]:
+    """
+    Stream (documents, vectors) batches for the images in paths. Files are read,
+    decoded and preprocessed for CLIP on a thread pool (Pillow releases the GIL while
+    decoding) one batch ahead of the embedding, which runs on whole tensor batches.
+    Image bytes are copied into a pack file and each Document only references them
+    (pack path, offset, length, sha256) next to a small base64 JPEG thumbnail;
+    identical images are stored once. The pack is written to a temporary file and
+    swapped in at the end, so readers of the previous pack are unaffected.
+    A thumbnail_cache (rag_multimodal's ThumbnailCache) gets its prompt-sized
+    thumbnails rendered from the same decode. aliases maps a path to the near-duplicates
+    it stands for (see dedup.find_near_duplicates), kept in its metadata.
+    """
+    report = report if report is not None else ImageIngestReport()
+    model = embeddings.embeddings
+    preprocess = getattr(model, "preprocess", None)
+    os.makedirs(os.path.dirname(pack_path) or ".", exist_ok=True)
+
+    stored = {}  # sha256 -> (offset, length, thumbnail)
+    start = time.perf_counter()
+    with open(f"{pack_path}.tmp", "wb") as pack, ThreadPoolExecutor(
+        max_workers
+    ) as executor:
+
+        def submit(batch):
+            return [
+                executor.submit(_load_image, path, preprocess, thumbnail_cache)
+                for path in batch
+            ]
+
+        batches = _batched(paths, batch_size)
+        pending = submit(next(batches, []))
+        while pending:
+            loaded = [future.result() for future in pending]
+            # Decode the next batch while this one is embedded
+            pending = submit(next(batches, []))
+
+            docs, images = [], []
+            for image in loaded:
+                report.decode_seconds += image.seconds
+                if image.error is not None:
+                    report.errors[image.path] = image.error
+                    continue
+                for size, thumbnail_data in image.rendered.items():
+                    thumbnail_cache.put(image.digest, size, thumbnail_data)
+                if image.digest not in stored:
+                    stored[image.digest] = (
+                        pack.tell(),
+                        len(image.data),
+                        image.thumbnail,
+                    )
+                    pack.write(image.data)
+                offset, length, thumbnail = stored[image.digest]
+                docs.append(
+                    Document(
+                        page_content=image.path,
+                        metadata={
+                            "modality": "image",
+                            "mime_type": image.mime_type,
+                            "source": image.path,
+                            "sha256": image.digest,
+                            "pack": pack_path,
+                            "offset": offset,
+                            "length": length,
+                            "thumbnail": thumbnail,
+                            "aliases": aliases.get(image.path, []) if aliases else [],
+                        },
+                    )
+                )
+                images.append(image)
+            if not docs:
+                continue
+
+            embed_start = time.perf_counter()
+            keys = [f"image:{doc.metadata['sha256']}" for doc in docs]
+            vectors = _embed_batch(embeddings, keys, images, report)
+            report.embed_seconds += time.perf_counter() - embed_start
+
+            report.images += len(docs)
+            report.batches += 1
+            report.stored = len(stored)
+            report.seconds = time.perf_counter() - start
+            yield docs, vectors
+
+    os.replace(f"{pack_path}.tmp", pack_path)
+    report.seconds = time.perf_counter() - start
+
+
+def is_image(doc: Document) -> bool:
+    # Set at ingest, so telling images from text never looks at the content
+    return doc.metadata.get("modality") == "image"
+
+
+def load_image_bytes(doc: Document) -> bytes:
+    # Only the pages of this one image are read from disk
+    metadata = doc.metadata
+    pack = _open_pack(metadata["pack"], os.stat(metadata["pack"]).st_mtime_ns)
+    return pack[metadata["offset"] : metadata["offset"] + metadata["length"]]
+
+
+def load_image_base64(doc: Document) -> str:
+    return base64.b64encode(load_image_bytes(doc)).decode("utf-8")
+
+
+def embed_image_file(embeddings: CachedEmbeddings, path: str) -> List[float]:
+    # Query side: embed an image that isn't in the pack
+    with open(path, "rb") as f:
+        data = f.read()
+    model = embeddings.embeddings
+    if hasattr(model, "embed_image"):
+        return model.embed_image([BytesIO(data)])[0]
+    return model.embed_query(f"image:{hashlib.sha256(data).hexdigest()}")
+
+
+def embed_image_files(
+    embeddings: CachedEmbeddings,
+    paths: List[str],
+    batch_size: int = 32,
+    max_workers: Optional[int] = None,
+    report: Optional[ImageIngestReport] = None,
+) -> np.ndarray:
+    """
+    Embed image files in batches with the same decode pool and embedding cache as
+    ingest_images, without storing them. Rows follow paths; unreadable files are
+    recorded in the report and get a zero vector.
+    """
+    report = report if report is not None else ImageIngestReport()
+    preprocess = getattr(embeddings.embeddings, "preprocess", None)
+    rows: List[Optional[List[float]]] = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers) as executor:
+        for batch in _batched(paths, batch_size):
+            loaded = list(
+                executor.map(lambda path: _load_image(path, preprocess, None), batch)
+            )
+            images = [image for image in loaded if image.error is None]
+            for image in loaded:
+                report.decode_seconds += image.seconds
+                if image.error is not None:
+                    report.errors[image.path] = image.error
+
+            embed_start = time.perf_counter()
+            keys = [f"image:{image.digest}" for image in images]
+            vectors = iter(
+                _embed_batch(embeddings, keys, images, report) if keys else []
+            )
+            report.embed_seconds += time.perf_counter() - embed_start
+            rows.extend(
+                next(vectors) if image.error is None else None for image in loaded
+            )
+            report.images += len(images)
+            report.batches += 1
+
+    dim = next((len(row) for row in rows if row is not None), 0)
+    report.seconds = time.perf_counter() - start
+    return np.array(
+        [row if row is not None else [0.0] * dim for row in rows], dtype=np.float32
+    ).reshape(len(rows), dim)
+
+
+def _batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _load_image(path: str, preprocess, thumbnail_cache):
+    from PIL import Image  # Deferred, only needed at ingest
+
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+
+        img = Image.open(BytesIO(data))
+        mime_type = Image.MIME.get(img.format, "application/octet-stream")
+        img.draft("RGB", DRAFT_SIZE)
+        img = img.convert("RGB")
+        tensor = preprocess(img) if preprocess is not None else None
+        rendered = (
+            thumbnail_cache.render(img, digest) if thumbnail_cache is not None else {}
+        )
+
+        img.thumbnail(THUMBNAIL_SIZE)
+        buffered = BytesIO()
+        img.save(buffered, format="JPEG", quality=70)
+        thumbnail = base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+        return _LoadedImage(
+            path,
+            data,
+            digest,
+            mime_type,
+            thumbnail,
+            rendered,
+            tensor,
+            time.perf_counter() - start,
+        )
+    except Exception as e:
+        return _LoadedImage(
+            path,
+            seconds=time.perf_counter() - start,
+            error=f"{type(e).__name__}: {e}",
+        )
+
+
+def _embed_batch(
+    embeddings: CachedEmbeddings,
+    keys: List[str],
+    images: List[_LoadedImage],
+    report: ImageIngestReport,
+) -> List[List[float]]:
+    # Cached by content hash, so re-ingesting (or a copy of) an image costs no model run
+    vectors = embeddings.document_cache.get_many(keys)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    report.cached += len(keys) - len(missing)
+
+    if missing:
+        model = embeddings.embeddings
+        if getattr(model, "preprocess", None) is not None:
+            computed = _encode_images(model, [images[i].tensor for i in missing])
+        elif hasattr(model, "embed_image"):
+            computed = model.embed_image([BytesIO(images[i].data) for i in missing])
+        else:
+            # Stand-ins without an image encoder embed the reference instead
+            computed = model.embed_documents([keys[i] for i in missing])
+        embeddings.document_cache.put_many([keys[i] for i in missing], computed)
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+
+    return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+
+def _encode_images(model, tensors) -> np.ndarray:
+    # One forward pass per batch, where OpenCLIPEmbeddings.embed_image runs one per image
+    import torch
+
+    with torch.no_grad():
+        features = model.model.encode_image(torch.stack(tensors))
+        features = features / features.norm(dim=-1, keepdim=True)
+    return features.cpu().numpy()
+
+
+@lru_cache(maxsize=8)
+def _open_pack(pack_path: str, mtime_ns: int) -> mmap.mmap:
+    # Keyed by mtime too, so a rewritten pack is mapped afresh
+    with open(pack_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
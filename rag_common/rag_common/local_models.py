@@ -0,0 +1,144 @@
+import hashlib
+import math
+import os
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Backends are picked by environment (or .env), so call sites don't change:
+#   RAG_EMBEDDINGS=hashing        HashingEmbeddings instead of the real model
+#   RAG_EMBEDDING_DIM=384         dimensions of the hashing embeddings
+#   RAG_LLM=canned                CannedChatModel instead of Gemini
+#   RAG_LLM_LATENCY=0.5           seconds before the first canned token
+#   RAG_LLM_TOKENS_PER_SEC=50     canned generation speed, unset for instant
+#   RAG_TOKENIZER=approximate     ~4 characters per token instead of tiktoken, for
+#                                 offline runs; changes every chunk boundary
+EMBEDDINGS_ENV = "RAG_EMBEDDINGS"
+LLM_ENV = "RAG_LLM"
+TOKENIZER_ENV = "RAG_TOKENIZER"
+
+
+def use_hashing_embeddings() -> bool:
+    return os.getenv(EMBEDDINGS_ENV, "").lower() == "hashing"
+
+
+def use_canned_llm() -> bool:
+    return os.getenv(LLM_ENV, "").lower() == "canned"
+
+
+def use_approximate_tokens() -> bool:
+    return os.getenv(TOKENIZER_ENV, "").lower() == "approximate"
+
+
+def hashing_embeddings_from_env() -> "HashingEmbeddings":
+    return HashingEmbeddings(size=int(os.getenv("RAG_EMBEDDING_DIM", "384")))
+
+
+def canned_chat_model_from_env() -> "CannedChatModel":
+    tokens_per_second = os.getenv("RAG_LLM_TOKENS_PER_SEC")
+    return CannedChatModel(
+        latency_seconds=float(os.getenv("RAG_LLM_LATENCY", "0")),
+        tokens_per_second=float(tokens_per_second) if tokens_per_second else None,
+    )
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic, dependency-free stand-in for a sentence embedding model. Word
+    unigrams and bigrams are hashed into a fixed number of signed buckets and the
+    vector is L2-normalized, so texts sharing words end up close together. Used to
+    measure our own code offline, without model or network time.
+    """
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    @property
+    def model_id(self) -> str:
+        return f"hashing/{self.size}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        return hashing_embedding(text, self.size)
+
+
+def hashing_embedding(text: str, size: int) -> List[float]:
+    # Plain function for callers without LangChain's Embeddings interface (rag_faq)
+    vector = [0.0] * size
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % size
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[bucket] += sign
+
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class CannedChatModel(BaseChatModel):
+    """
+    Stand-in chat model that answers from a fixed list of responses, picked by a hash
+    of the prompt so the same prompt always gets the same answer. latency_seconds and
+    tokens_per_second simulate time to first token and generation speed, for load
+    tests that should exercise streaming without calling a real model.
+    """
+
+    responses: List[str] = [
+        "Based on the provided context, here is a canned answer for load testing.",
+        "This is a canned response. The retrieved sources were not read by a model.",
+    ]
+    latency_seconds: float = 0.0
+    tokens_per_second: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "canned"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        content = "".join(
+            chunk.message.content for chunk in self._stream(messages, stop, **kwargs)
+        )
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_seconds)
+        for token in re.findall(r"\S+\s*", self._pick(messages)):
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _pick(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).digest()
+        return self.responses[int.from_bytes(digest, "little") % len(self.responses)]
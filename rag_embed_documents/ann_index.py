@@ -0,0 +1,187 @@
+import math
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from langchain.schema import Document
+
+# flat: exact search, the baseline everything else is measured against
+# hnsw: graph index, no training, fast but cannot delete vectors
+# ivf_flat / ivf_pq: inverted lists over k-means cells, ivf_pq also compresses vectors
+# sq8: exact scan over int8 scalar-quantized vectors, 4x smaller than float32
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq8")
+
+# Index types that support removing vectors, needed for incremental updates. LangChain's
+# FAISS.delete expects remove_ids to renumber the remaining vectors, which only the
+# flat-code indexes do; IVF indexes keep their labels and are rebuilt instead
+REMOVABLE_INDEX_TYPES = ("flat", "sq8")
+
+# build_index parameters that change the index itself, unlike nprobe/ef_search which
+# can be set on an index that was already built
+BUILD_PARAMS = ("hnsw_m", "nlist", "pq_m", "train_size", "seed")
+
+
+def create_index(
+    index_type: str,
+    dim: int,
+    num_vectors: int,
+    hnsw_m: int = 32,
+    nlist: Optional[int] = None,
+    pq_m: int = 16,
+) -> faiss.Index:
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        return faiss.IndexHNSWFlat(dim, hnsw_m)
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # ~4*sqrt(n) cells, but k-means wants at least ~39 training points per cell
+        nlist = nlist or int(4 * math.sqrt(num_vectors))
+        nlist = max(1, min(nlist, num_vectors // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            return faiss.IndexIVFFlat(quantizer, dim, nlist)
+
+        # Sub-quantizers must divide the dimension, and 2^nbits centroids need as
+        # many training points
+        pq_m = max(m for m in range(1, pq_m + 1) if dim % m == 0)
+        nbits = max(1, min(8, int(math.log2(max(num_vectors, 2)))))
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, nbits)
+
+    raise ValueError(
+        f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}"
+    )
+
+
+def is_removable(index: faiss.Index) -> bool:
+    # The index classes behind REMOVABLE_INDEX_TYPES
+    return isinstance(index, (faiss.IndexFlat, faiss.IndexScalarQuantizer))
+
+
+def set_search_params(
+    index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+) -> None:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe is not None:
+        ivf.nprobe = nprobe
+    if isinstance(index, faiss.IndexHNSW) and ef_search is not None:
+        index.hnsw.efSearch = ef_search
+
+
+def build_index(
+    vectors: np.ndarray,
+    index_type: str = "flat",
+    train_size: int = 50_000,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    seed: int = 0,
+    **create_params,
+) -> faiss.Index:
+    # create_params are the structural knobs of create_index: hnsw_m, nlist, pq_m
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = create_index(index_type, vectors.shape[1], len(vectors), **create_params)
+
+    if not index.is_trained:
+        # Train on a random sample of the chunks rather than the whole corpus
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(len(vectors), min(train_size, len(vectors)), replace=False)
+        index.train(vectors[np.sort(sample)])
+
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    index.add(vectors)
+    return index
+
+
+def build_vector_store(
+    docs: List[Document],
+    embeddings: Embeddings,
+    ids: Optional[List[str]] = None,
+    index_type: str = "flat",
+    vectors: Optional[np.ndarray] = None,
+    **index_params,
+) -> FAISS:
+    if vectors is None:
+        vectors = np.asarray(
+            embeddings.embed_documents([doc.page_content for doc in docs]),
+            dtype=np.float32,
+        )
+    index = build_index(vectors, index_type, **index_params)
+
+    ids = ids or [str(i) for i in range(len(docs))]
+    docstore = InMemoryDocstore(dict(zip(ids, docs)))
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+
+def compare_index_types(
+    docs: List[Document],
+    embeddings: Embeddings,
+    queries: List[str],
+    k: int = 4,
+    index_types=INDEX_TYPES,
+    search_params: Optional[Dict[str, dict]] = None,
+) -> List[dict]:
+    """
+    Build every index type from the same chunk vectors and report recall@k against the
+    exact (flat) index, search latency and serialized index size for each.
+    search_params maps an index type to extra build_index arguments, e.g.
+    {"ivf_pq": {"nprobe": 16}, "hnsw": {"ef_search": 64}}.
+    """
+    search_params = search_params or {}
+    vectors = np.asarray(
+        embeddings.embed_documents([doc.page_content for doc in docs]),
+        dtype=np.float32,
+    )
+    embed_queries = getattr(embeddings, "embed_queries", embeddings.embed_documents)
+    query_vectors = np.asarray(embed_queries(queries), dtype=np.float32)
+    k = min(k, len(vectors))
+
+    exact = build_index(vectors, "flat")
+    _, exact_ids = exact.search(query_vectors, k)
+
+    report = []
+    for index_type in index_types:
+        params = search_params.get(index_type, {})
+        build_start = time.perf_counter()
+        index = build_index(vectors, index_type, **params)
+        build_seconds = time.perf_counter() - build_start
+
+        # One query at a time, as an online retriever would search
+        latencies = []
+        found_ids = []
+        for query_vector in query_vectors:
+            start = time.perf_counter()
+            _, ids = index.search(query_vector[None, :], k)
+            latencies.append(time.perf_counter() - start)
+            found_ids.append(ids[0])
+
+        recall = np.mean(
+            [
+                len(set(found) & set(expected)) / k
+                for found, expected in zip(found_ids, exact_ids)
+            ]
+        )
+        latencies_ms = np.array(latencies) * 1000
+        report.append(
+            {
+                "index_type": index_type,
+                "params": params,
+                f"recall@{k}": float(recall),
+                "mean_ms": float(latencies_ms.mean()),
+                "p50_ms": float(np.percentile(latencies_ms, 50)),
+                "p95_ms": float(np.percentile(latencies_ms, 95)),
+                "build_seconds": build_seconds,
+                "index_bytes": int(faiss.serialize_index(index).nbytes),
+            }
+        )
+    return report
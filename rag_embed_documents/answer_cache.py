@@ -0,0 +1,134 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+@dataclass
+class _Entry:
+    answer: str
+    expires_at: float
+    vector: np.ndarray
+
+
+class AnswerCache:
+    """
+    Cache of generated answers. A lookup first matches the normalized query text exactly,
+    then falls back to the most similar cached query by embedding cosine similarity.
+    Entries expire after ttl_seconds, and the whole cache is dropped when the index
+    version it was filled against changes.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1024,
+    ):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._index_version: Optional[str] = None
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._keys: list = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    def get(self, query: str, index_version: Optional[str] = None) -> Optional[str]:
+        key = self._normalize(query)
+        with self._lock:
+            self._check_version(index_version)
+            self._expire()
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.exact_hits += 1
+                return entry.answer
+            if not self._keys:
+                self.misses += 1
+                return None
+
+        # Embed outside the lock, so concurrent lookups don't queue behind the model
+        vector = self._embed(query)
+        with self._lock:
+            if self._keys:
+                scores = self._matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    self.semantic_hits += 1
+                    return self._entries[self._keys[best]].answer
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, answer: str, index_version: Optional[str] = None) -> None:
+        key = self._normalize(query)
+        vector = self._embed(query)
+
+        with self._lock:
+            self._check_version(index_version)
+            self._entries.pop(key, None)
+            self._entries[key] = _Entry(
+                answer=answer,
+                expires_at=time.monotonic() + self.ttl_seconds,
+                vector=vector,
+            )
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._rebuild_matrix()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rebuild_matrix()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
+
+    def _check_version(self, index_version: Optional[str]) -> None:
+        if index_version != self._index_version:
+            self._entries.clear()
+            self._rebuild_matrix()
+            self._index_version = index_version
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items() if entry.expires_at <= now
+        ]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._rebuild_matrix()
+
+    def _rebuild_matrix(self) -> None:
+        self._keys = list(self._entries)
+        if self._keys:
+            self._matrix = np.stack([self._entries[key].vector for key in self._keys])
+        else:
+            self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return re.sub(r"\s+", " ", query).strip().lower()
@@ -0,0 +1,236 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import numpy as np
+from langchain.schema import Document
+
+from ann_index import INDEX_TYPES, build_vector_store
+from bm25 import BM25Index
+from chunking import create_chunks_from_files, create_text_splitter, to_documents
+from rag_common.local_models import TOKENIZER_ENV, HashingEmbeddings
+from query import hybrid_query
+
+DATA_DIR = "./Big Star Collectibles"
+QA_FILE = "../rag_faq/data/rag_sample_qas_from_kis.csv"
+K_VALUES = (1, 3, 5, 10)
+
+
+def load_embeddings(backend: str):
+    if backend in ("auto", "huggingface"):
+        try:
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            from embed_store import EMBEDDING_MODEL
+
+            return "huggingface", HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        except Exception as e:
+            if backend == "huggingface":
+                raise
+            print(f"HuggingFace model unavailable ({e}), using hashing embeddings")
+    return "hashing", HashingEmbeddings()
+
+
+def select_tokenizer(tokenizer: str) -> str:
+    # The approximate splitter is opt-in for the rest of the code base, the benchmark
+    # falls back to it so it still runs offline
+    if tokenizer == "auto":
+        try:
+            create_text_splitter()
+            return "tiktoken"
+        except Exception as e:
+            print(f"tiktoken encoding unavailable ({e}), using ~4 characters per token")
+            tokenizer = "approximate"
+    if tokenizer == "approximate":
+        # Read by chunking and context, including in chunking's worker processes
+        os.environ[TOKENIZER_ENV] = "approximate"
+    return tokenizer
+
+
+def load_qa_corpus(path: str):
+    # Each knowledge item (ki_text) is chunked into the corpus, and its sample question
+    # counts as answered when any chunk of that knowledge item is retrieved
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    text_splitter = create_text_splitter()
+    docs = []
+    for row in rows:
+        texts = text_splitter.split_text(row["ki_text"])
+        docs.extend(to_documents(row["ki_topic"], texts))
+
+    queries = [(row["sample_question"], row["ki_topic"]) for row in rows]
+    return docs, queries
+
+
+def measure_ingest(
+    name: str, docs: List[Document], chunk_seconds: float, embeddings
+) -> dict:
+    start = time.perf_counter()
+    vectors = np.asarray(
+        embeddings.embed_documents([doc.page_content for doc in docs]),
+        dtype=np.float32,
+    )
+    embed_seconds = time.perf_counter() - start
+
+    build_seconds = {}
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        build_vector_store(docs, embeddings, index_type=index_type, vectors=vectors)
+        build_seconds[index_type] = time.perf_counter() - start
+
+    return {
+        "dataset": name,
+        "chunks": len(docs),
+        "chunk_seconds": chunk_seconds,
+        "embed_seconds": embed_seconds,
+        "chunks_per_sec": len(docs) / (chunk_seconds + embed_seconds),
+        "index_build_seconds": build_seconds,
+    }
+
+
+def evaluate(
+    search: Callable[[str, int], List[Document]],
+    queries: List[tuple],
+    repeat: int,
+) -> dict:
+    max_k = max(K_VALUES)
+    latencies = []
+    ranks = []
+
+    for query, topic in queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            docs = search(query, max_k)
+            latencies.append(time.perf_counter() - start)
+
+        # Rank of the first chunk from the expected knowledge item, if any
+        titles = [doc.metadata["doc_title"] for doc in docs]
+        ranks.append(titles.index(topic) + 1 if topic in titles else None)
+
+    latencies_ms = np.array(latencies) * 1000
+    result = {
+        "queries": len(queries),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "mrr": float(np.mean([1 / rank if rank else 0.0 for rank in ranks])),
+    }
+    for k in K_VALUES:
+        # One relevant knowledge item per question, so recall@k is its hit rate in top k
+        result[f"recall@{k}"] = float(
+            np.mean([rank is not None and rank <= k for rank in ranks])
+        )
+    return result
+
+
+def run(backend: str, repeat: int, tokenizer: str = "auto") -> dict:
+    backend, embeddings = load_embeddings(backend)
+    tokenizer = select_tokenizer(tokenizer)
+
+    start = time.perf_counter()
+    corpus_docs = create_chunks_from_files(DATA_DIR)
+    corpus_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    qa_docs, queries = load_qa_corpus(QA_FILE)
+    qa_seconds = time.perf_counter() - start
+
+    ingest = [
+        measure_ingest(
+            "big_star_collectibles", corpus_docs, corpus_seconds, embeddings
+        ),
+        measure_ingest("faq_knowledge_items", qa_docs, qa_seconds, embeddings),
+    ]
+
+    # Retrieval quality is measured on the Q&A corpus, the only one with ground truth
+    vectors = np.asarray(
+        embeddings.embed_documents([doc.page_content for doc in qa_docs]),
+        dtype=np.float32,
+    )
+    stores = {
+        index_type: build_vector_store(
+            qa_docs, embeddings, index_type=index_type, vectors=vectors
+        )
+        for index_type in INDEX_TYPES
+    }
+    bm25_index = BM25Index()
+    bm25_index.add_documents(qa_docs)
+
+    retrievers: Dict[str, Callable[[str, int], List[Document]]] = {
+        f"dense_{index_type}": (
+            lambda query, k, store=store: store.similarity_search(query, k=k)
+        )
+        for index_type, store in stores.items()
+    }
+    retrievers["bm25"] = lambda query, k: [
+        doc for doc, _ in bm25_index.search(query, k=k)
+    ]
+    retrievers["hybrid_flat_bm25"] = lambda query, k: hybrid_query(
+        stores["flat"], bm25_index, query, k=k
+    )
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "embeddings": backend,
+        "tokenizer": tokenizer,
+        "repeat": repeat,
+        "ingest": ingest,
+        "retrievers": {
+            name: evaluate(search, queries, repeat)
+            for name, search in retrievers.items()
+        },
+    }
+
+
+def compare(results: dict, baseline: dict) -> None:
+    for name, metrics in results["retrievers"].items():
+        previous = baseline.get("retrievers", {}).get(name)
+        if previous is None:
+            continue
+        changes = ", ".join(
+            f"{metric} {previous[metric]:.3f} -> {metrics[metric]:.3f}"
+            for metric in ("p95_ms", "recall@3", "mrr")
+        )
+        print(f"{name}: {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval latency/recall benchmark")
+    parser.add_argument(
+        "--embeddings",
+        choices=["auto", "huggingface", "hashing"],
+        default="auto",
+        help="auto uses the HuggingFace model when installed, hashing otherwise",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        choices=["auto", "tiktoken", "approximate"],
+        default="auto",
+        help="auto uses tiktoken when its encoding loads, approximate otherwise",
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per query")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = run(args.embeddings, args.repeat, args.tokenizer)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["retrievers"], indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
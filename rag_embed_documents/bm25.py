@@ -0,0 +1,140 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from chunking import chunk_id
+
+# Words, plus hyphenated/underscored compounds such as SKUs ("BSC-1042")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        # Index the parts of a compound too, so "1042" alone still finds "BSC-1042"
+        parts = re.split(r"[-_]", token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring. Documents are keyed by chunk_id,
+    so the index can be synced incrementally with a re-chunked corpus and persisted
+    as JSON next to the FAISS index.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.documents: Dict[str, Document] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add_documents(
+        self, docs: List[Document], ids: Optional[List[str]] = None
+    ) -> None:
+        ids = ids or [chunk_id(doc) for doc in docs]
+        for doc_id, doc in zip(ids, docs):
+            if doc_id in self.documents:
+                continue
+
+            term_counts = Counter(tokenize(doc.page_content))
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, {})[doc_id] = count
+
+            length = sum(term_counts.values())
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+            self.documents[doc_id] = doc
+
+    def remove(self, ids: List[str]) -> None:
+        for doc_id in ids:
+            doc = self.documents.pop(doc_id, None)
+            if doc is None:
+                continue
+
+            for term in set(tokenize(doc.page_content)):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def sync(self, docs: List[Document]) -> Tuple[int, int]:
+        # Bring the index in line with the current chunks, touching only what changed
+        chunks = {chunk_id(doc): doc for doc in docs}
+        stale_ids = [doc_id for doc_id in self.documents if doc_id not in chunks]
+        new_ids = [doc_id for doc_id in chunks if doc_id not in self.documents]
+
+        self.remove(stale_ids)
+        self.add_documents([chunks[doc_id] for doc_id in new_ids], new_ids)
+        return len(new_ids), len(stale_ids)
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        if not self.documents:
+            return []
+
+        num_docs = len(self.documents)
+        avg_length = self.total_length / num_docs
+        scores: Dict[str, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            df = len(postings)
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (
+                    1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length
+                )
+                term_score = idf * tf * (self.k1 + 1) / (tf + norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + term_score
+
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.documents[doc_id], score) for doc_id, score in top]
+
+    def save(self, path: str) -> None:
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "documents": {
+                doc_id: {"page_content": doc.page_content, "metadata": doc.metadata}
+                for doc_id, doc in self.documents.items()
+            },
+        }
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        # Postings are cheap to rebuild from the stored chunks, so only those are saved
+        with open(path) as f:
+            data = json.load(f)
+
+        index = cls(k1=data["k1"], b=data["b"])
+        documents = data["documents"]
+        index.add_documents(
+            [Document(**doc) for doc in documents.values()], list(documents)
+        )
+        return index
+
+    @classmethod
+    def load_or_create(cls, path: str) -> "BM25Index":
+        return cls.load(path) if os.path.exists(path) else cls()
@@ -1,5 +1,9 @@
+import hashlib
 import os
-from typing import List
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
 
 from langchain.text_splitter import (
     CharacterTextSplitter,
@@ -8,28 +12,164 @@ from langchain.schema import (
     Document,
 )  # Add metadata to text and prepare it for vector storage
 
+from rag_common.local_models import use_approximate_tokens
 
-def create_chunks_from_files(data_dir) -> List[Document]:
+CHUNK_SIZE = 128
+CHUNK_OVERLAP = 32
+
+# Each worker process builds its own tokenizer-backed splitter once and reuses it
+_worker_text_splitter = None
+
+
+def create_text_splitter() -> CharacterTextSplitter:
+    if use_approximate_tokens():
+        # Opt-in only: other chunk boundaries mean other chunk ids, so an index built
+        # this way is rebuilt by the next tiktoken run
+        return CharacterTextSplitter(
+            chunk_size=CHUNK_SIZE * 4, chunk_overlap=CHUNK_OVERLAP * 4, separator="\n"
+        )
+    return CharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separator="\n"
+    )
+
+
+def create_chunks_from_files(data_dir, bm25_index=None) -> List[Document]:
     file_texts = []
 
     files = os.listdir(data_dir)
-    text_splitter = CharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=128, chunk_overlap=32, separator="\n"
-    )
+    text_splitter = create_text_splitter()
 
     for file in files:
         with open(f"{data_dir}/{file}") as f:
             file_text = f.read()
         texts = text_splitter.split_text(file_text)
-        for i, chunked_text in enumerate(texts):
-            file_texts.append(
-                Document(
-                    page_content=chunked_text,
-                    metadata={
-                        "doc_title": file.split(".")[0],
-                        "chunk_num": i,
-                    },
-                )
-            )
+        doc_title = file_doc_title(os.path.join(data_dir, file), data_dir)
+        file_texts.extend(to_documents(doc_title, texts))
+
+    if bm25_index is not None:
+        # Keep the keyword index (bm25.BM25Index) in step with the chunks just produced
+        added, removed = bm25_index.sync(file_texts)
+        print(f"BM25 index: {added} chunks added, {removed} removed")
 
     return file_texts
+
+
+def file_doc_title(path: str, data_dir: str) -> str:
+    # Relative path without extension, so files with the same name in subdirectories stay
+    # apart. Every ingest path must title a file the same way, chunk ids depend on it
+    doc_title = os.path.splitext(os.path.relpath(path, data_dir))[0]
+    return doc_title.replace(os.sep, "/")
+
+
+def to_documents(doc_title: str, texts: List[str]) -> List[Document]:
+    return [
+        Document(
+            page_content=chunked_text,
+            metadata={
+                "doc_title": doc_title,
+                "chunk_num": i,
+            },
+        )
+        for i, chunked_text in enumerate(texts)
+    ]
+
+
+@dataclass
+class ChunkingStats:
+    files: int = 0
+    chunks: int = 0
+    wall_seconds: float = 0.0
+    file_seconds: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def files_per_sec(self) -> float:
+        return self.files / self.wall_seconds if self.wall_seconds else 0.0
+
+
+def iter_files(data_dir: str) -> Iterator[str]:
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()  # Deterministic walk order
+        for file in sorted(files):
+            yield os.path.join(root, file)
+
+
+def iter_chunk_batches(
+    data_dir: str,
+    batch_size: int = 1024,
+    max_workers: Optional[int] = None,
+    stats: Optional[ChunkingStats] = None,
+) -> Iterator[List[Document]]:
+    """
+    Stream chunks of every file under data_dir (recursively) in batches of at most
+    batch_size documents. Files are split in a process pool, with only a bounded number
+    of files in flight, so memory stays flat regardless of the corpus size. A file that
+    fails to read or split is recorded in stats.errors and skipped.
+    """
+    stats = stats if stats is not None else ChunkingStats()
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_workers * 4
+
+    start = time.perf_counter()
+    files = iter_files(data_dir)
+    batch: List[Document] = []
+
+    executor = ProcessPoolExecutor(max_workers, initializer=_init_worker)
+    try:
+        pending = set()
+        for path in files:
+            pending.add(executor.submit(_split_file, path))
+            if len(pending) < max_pending:
+                continue
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch.extend(_collect(future.result(), data_dir, stats))
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+
+        for future in pending:
+            batch.extend(_collect(future.result(), data_dir, stats))
+        while batch:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        stats.wall_seconds += time.perf_counter() - start
+
+
+def _init_worker() -> None:
+    global _worker_text_splitter
+    _worker_text_splitter = create_text_splitter()
+
+
+def _split_file(path: str):
+    start = time.perf_counter()
+    try:
+        with open(path) as f:
+            file_text = f.read()
+        texts = _worker_text_splitter.split_text(file_text)
+        return path, texts, time.perf_counter() - start, None
+    except Exception as e:
+        return path, [], time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+def _collect(result, data_dir: str, stats: ChunkingStats) -> List[Document]:
+    path, texts, elapsed, error = result
+    stats.files += 1
+    stats.file_seconds[path] = elapsed
+    if error is not None:
+        stats.errors[path] = error
+        return []
+
+    stats.chunks += len(texts)
+    return to_documents(file_doc_title(path, data_dir), texts)
+
+
+def chunk_id(doc: Document) -> str:
+    # Content hash of a chunk, stable across runs as long as its text and position are unchanged
+    key = "\0".join(
+        [doc.metadata["doc_title"], str(doc.metadata["chunk_num"]), doc.page_content]
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
@@ -0,0 +1,138 @@
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from rag_common.local_models import use_approximate_tokens
+
+TOKEN_BUDGET = 512
+
+
+@lru_cache(maxsize=None)
+def create_token_counter() -> Callable[[str], int]:
+    # Same tokenizer as chunking.create_text_splitter, so budgets and chunk sizes agree.
+    # Built on first use and kept for every later pack_context call
+    if use_approximate_tokens():
+        return lambda text: len(text) // 4
+
+    import tiktoken
+
+    encoding = tiktoken.get_encoding("gpt2")
+    return lambda text: len(encoding.encode(text))
+
+
+def merge_adjacent(docs: List[Document]) -> List[Document]:
+    """
+    Merge chunks that follow each other in the same document into one passage, dropping
+    the lines the splitter repeated between them (CHUNK_OVERLAP). Passages keep the
+    order in which their first chunk appears in docs.
+    """
+    groups: Dict[str, List[Document]] = {}
+    for doc in docs:
+        groups.setdefault(doc.metadata["doc_title"], []).append(doc)
+
+    passages = []  # (position of the first chunk in docs, passage)
+    position = {id(doc): i for i, doc in enumerate(docs)}
+    for doc_title, chunks in groups.items():
+        chunks = sorted(chunks, key=lambda doc: doc.metadata["chunk_num"])
+        run = [chunks[0]]
+        for chunk in chunks[1:]:
+            if chunk.metadata["chunk_num"] == run[-1].metadata["chunk_num"] + 1:
+                run.append(chunk)
+            else:
+                passages.append(_merge_run(doc_title, run, position))
+                run = [chunk]
+        passages.append(_merge_run(doc_title, run, position))
+
+    return [passage for _, passage in sorted(passages, key=lambda item: item[0])]
+
+
+def pack_context(
+    query: str,
+    docs: List[Document],
+    embeddings: Embeddings,
+    token_budget: int = TOKEN_BUDGET,
+    lambda_mult: float = 0.5,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> List[Document]:
+    """
+    Pick chunks from the retrieved candidates by maximal marginal relevance, so
+    near-duplicates of an already picked chunk rank low, and merge adjacent chunks of
+    the same document. Stops before the merged passages would exceed token_budget.
+    """
+    if not docs:
+        return []
+    count_tokens = count_tokens or create_token_counter()
+
+    # Candidates were just embedded at ingest, so this is served by the embedding cache
+    query_vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+    doc_vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+    order = maximal_marginal_relevance(
+        query_vector, doc_vectors, lambda_mult=lambda_mult, k=len(docs)
+    )
+
+    selected: List[Document] = []
+    packed: List[Document] = []
+    for i in order:
+        candidate = merge_adjacent(selected + [docs[i]])
+        tokens = sum(count_tokens(doc.page_content) for doc in candidate)
+        if tokens > token_budget:
+            break
+        selected.append(docs[i])
+        packed = candidate
+
+    if not packed:
+        # Always keep the most relevant chunk, even if it alone is over budget
+        packed = merge_adjacent([docs[order[0]]])
+    return packed
+
+
+class ContextPackingRetriever(BaseRetriever):
+    """Wraps a retriever and packs its results with pack_context before the prompt."""
+
+    retriever: BaseRetriever
+    embeddings: Embeddings
+    token_budget: int = TOKEN_BUDGET
+    lambda_mult: float = 0.5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = self.retriever.invoke(query)
+        return pack_context(
+            query,
+            docs,
+            self.embeddings,
+            token_budget=self.token_budget,
+            lambda_mult=self.lambda_mult,
+        )
+
+
+def _merge_run(doc_title: str, run: List[Document], position: Dict[int, int]):
+    lines = run[0].page_content.split("\n")
+    for chunk in run[1:]:
+        next_lines = chunk.page_content.split("\n")
+        overlap = max(
+            (
+                n
+                for n in range(min(len(lines), len(next_lines)), 0, -1)
+                if lines[-n:] == next_lines[:n]
+            ),
+            default=0,
+        )
+        lines.extend(next_lines[overlap:])
+
+    passage = Document(
+        page_content="\n".join(lines),
+        metadata={
+            "doc_title": doc_title,
+            "chunk_num": run[0].metadata["chunk_num"],
+            "chunk_nums": [chunk.metadata["chunk_num"] for chunk in run],
+        },
+    )
+    return min(position[id(chunk)] for chunk in run), passage
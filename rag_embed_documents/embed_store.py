@@ -1,20 +1,239 @@
-from typing import List
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple
 
 from langchain_community.vectorstores import (
     FAISS,  # Facebook AI Similarity Search
     VectorStore,
 )
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
 
+from ann_index import (
+    BUILD_PARAMS,
+    REMOVABLE_INDEX_TYPES,
+    build_vector_store,
+    set_search_params,
+)
+from chunking import chunk_id
+from rag_common.embedding_cache import CachedEmbeddings
+from rag_common.local_models import hashing_embeddings_from_env, use_hashing_embeddings
+from mmap_store import MmapVectorStore
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MANIFEST_FILE = "manifest.json"
+
+
+def create_embeddings(model_name: str = EMBEDDING_MODEL) -> Tuple[Embeddings, str]:
+    # Returns the model and the id its vectors are cached and indexed under
+    if use_hashing_embeddings():
+        embeddings = hashing_embeddings_from_env()
+        return embeddings, embeddings.model_id
+
+    # Deferred, torch and sentence-transformers take seconds to import
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name), model_name
+
+
+def load_embeddings(model_name: str = EMBEDDING_MODEL) -> CachedEmbeddings:
+    embeddings, model_id = create_embeddings(model_name)
+    return CachedEmbeddings(embeddings, model_id=model_id)
+
+
+def embed_and_store(
+    file_texts: List[Document],
+    index_dir: Optional[str] = None,
+    model_name: str = EMBEDDING_MODEL,
+    index_type: str = "flat",
+    backend: str = "faiss",
+    **index_params,
+) -> VectorStore:
+    # index_params are passed on to ann_index.build_index, e.g. nprobe or ef_search
+    embeddings = load_embeddings(model_name)
+    # An index built with one model (or the hashing stand-in) is never reused by another
+    model_name = embeddings.model_id
+
+    if backend == "mmap":
+        return load_or_build_mmap_store(
+            file_texts, embeddings, index_dir or "./mmap_index"
+        )
+
+    if index_dir is None:
+        if index_type == "flat":
+            vector_store = FAISS.from_documents(
+                documents=file_texts,
+                embedding=embeddings,
+            )
+        else:
+            vector_store = build_vector_store(
+                file_texts, embeddings, index_type=index_type, **index_params
+            )
+        return vector_store
+
+    return sync_vector_store(
+        file_texts, embeddings, index_dir, model_name, index_type, **index_params
+    )
+
+
+def sync_vector_store(
+    file_texts: List[Document],
+    embeddings,
+    index_dir: str,
+    model_name: str,
+    index_type: str = "flat",
+    **index_params,
+) -> FAISS:
+    # Chunks are keyed by content hash, so only new or changed chunks get embedded
+    chunks = {chunk_id(doc): doc for doc in file_texts}
+
+    manifest = _read_manifest(index_dir)
+    build_params = _build_params(index_params)
+    if (
+        manifest is None
+        or manifest["model_name"] != model_name
+        or manifest.get("index_type", "flat") != index_type
+        or manifest.get("build_params", {}) != build_params
+    ):
+        # No usable index on disk (or it was built with another model, index type or
+        # build parameters)
+        return _rebuild(
+            chunks, embeddings, index_dir, model_name, index_type, **index_params
+        )
+
+    vector_store = FAISS.load_local(
+        index_dir,
+        embeddings,
+        allow_dangerous_deserialization=True,  # Our own pickled docstore
+    )
+    set_search_params(
+        vector_store.index,
+        nprobe=index_params.get("nprobe"),
+        ef_search=index_params.get("ef_search"),
+    )
+    stored_ids = set(vector_store.index_to_docstore_id.values())
+
+    # Chunks of deleted files, and the old version of changed chunks
+    stale_ids = [cid for cid in stored_ids if cid not in chunks]
+    new_ids = [cid for cid in chunks if cid not in stored_ids]
 
-def embed_and_store(file_texts: List[Document]) -> VectorStore:
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
+    if stale_ids and index_type not in REMOVABLE_INDEX_TYPES:
+        # The index can't drop vectors in place, rebuild it (unchanged chunks are cached)
+        return _rebuild(
+            chunks, embeddings, index_dir, model_name, index_type, **index_params
+        )
+
+    if stale_ids:
+        vector_store.delete(ids=stale_ids)
+    if new_ids:
+        vector_store.add_documents([chunks[cid] for cid in new_ids], ids=new_ids)
+    if stale_ids or new_ids:
+        save_vector_store(vector_store, index_dir, model_name, index_type, build_params)
+
+    print(
+        f"Loaded index from {index_dir}: {len(new_ids)} chunks embedded, "
+        f"{len(stale_ids)} removed, {len(chunks) - len(new_ids)} unchanged"
     )
+    return vector_store
+
+
+def load_or_build_mmap_store(
+    file_texts: List[Document], embeddings, index_dir: str
+) -> MmapVectorStore:
+    # The store is an immutable snapshot: reuse it when the corpus is unchanged and
+    # rebuild otherwise, with unchanged chunks served from the embedding cache
+    chunks = {chunk_id(doc): doc for doc in file_texts}
+    if MmapVectorStore.exists(index_dir):
+        vector_store = MmapVectorStore(embeddings, index_dir)
+        if vector_store.version == _fingerprint(chunks):
+            print(f"Loaded mmap store with {len(vector_store)} chunks from {index_dir}")
+            return vector_store
+
+    vector_store = MmapVectorStore.build(list(chunks.values()), embeddings, index_dir)
+    print(f"Built mmap store with {len(vector_store)} chunks at {index_dir}")
+    return vector_store
+
+
+def index_version(vector_store: VectorStore) -> str:
+    if isinstance(vector_store, MmapVectorStore):
+        return vector_store.version
+    return _fingerprint(vector_store.index_to_docstore_id.values())
+
+
+def _fingerprint(ids) -> str:
+    # Chunk ids are content hashes, so this fingerprints the indexed content
+    ids = sorted(ids)
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16]
 
-    vector_store = FAISS.from_documents(
-        documents=file_texts,
-        embedding=embeddings,
+
+def _rebuild(
+    chunks: dict,
+    embeddings,
+    index_dir: str,
+    model_name: str,
+    index_type: str,
+    **index_params,
+) -> FAISS:
+    vector_store = build_vector_store(
+        list(chunks.values()),
+        embeddings,
+        ids=list(chunks.keys()),
+        index_type=index_type,
+        **index_params,
+    )
+    save_vector_store(
+        vector_store, index_dir, model_name, index_type, _build_params(index_params)
     )
+    print(f"Built {index_type} index with {len(chunks)} chunks at {index_dir}")
     return vector_store
+
+
+def _build_params(index_params: dict) -> dict:
+    # Only the parameters given explicitly, the defaults are implied by their absence
+    return {
+        name: index_params[name]
+        for name in BUILD_PARAMS
+        if index_params.get(name) is not None
+    }
+
+
+def _read_manifest(index_dir: str) -> Optional[dict]:
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path) or not os.path.exists(
+        os.path.join(index_dir, "index.faiss")
+    ):
+        return None
+
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_vector_store(
+    vector_store: FAISS,
+    index_dir: str,
+    model_name: str,
+    index_type: str = "flat",
+    build_params: Optional[dict] = None,
+) -> None:
+    # save_local overwrites index.faiss and index.pkl in place, one after the other.
+    # Without a manifest a half-written pair is rebuilt rather than loaded, so drop it
+    # first and write it back once both files are complete.
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    try:
+        os.remove(manifest_path)
+    except FileNotFoundError:
+        pass
+    vector_store.save_local(index_dir)
+
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(
+            {
+                "model_name": model_name,
+                "index_type": index_type,
+                "build_params": build_params or {},
+                "num_chunks": len(vector_store.index_to_docstore_id),
+            },
+            f,
+        )
+    os.replace(f"{manifest_path}.tmp", manifest_path)
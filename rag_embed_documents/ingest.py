@@ -0,0 +1,173 @@
+import os
+import resource
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain.schema import Document
+
+from chunking import chunk_id
+from embed_store import (
+    EMBEDDING_MODEL,
+    create_embeddings,
+    load_embeddings,
+    save_vector_store,
+)
+from rag_common.local_models import use_hashing_embeddings
+
+# Each worker process loads the embedding model once and reuses it for every batch
+_worker_embeddings = None
+
+
+@dataclass
+class IngestReport:
+    chunks: int = 0
+    batches: int = 0
+    cached: int = 0
+    seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+    peak_worker_rss_mb: float = 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"Ingested {self.chunks} chunks ({self.cached} from cache) in "
+            f"{self.batches} batches, {self.seconds:.1f}s, "
+            f"{self.chunks_per_sec:.1f} chunks/sec, peak RSS {self.peak_rss_mb:.0f} MB "
+            f"(main), {self.peak_worker_rss_mb:.0f} MB (largest worker)"
+        )
+
+
+def ingest_documents(
+    chunk_batches: Iterable[List[Document]],
+    model_name: str = EMBEDDING_MODEL,
+    batch_size: int = 256,
+    max_workers: Optional[int] = None,
+    index_dir: Optional[str] = None,
+    verbose: bool = True,
+) -> Tuple[FAISS, IngestReport]:
+    """
+    Embed a stream of chunks (e.g. from chunking.iter_chunk_batches) in batches of
+    batch_size across a pool of worker processes, adding vectors to the index as soon
+    as each batch finishes. Chunks found in the embedding cache never reach the workers.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_workers * 2
+
+    # The main process keeps the model for query embedding and owns the cache
+    embeddings = load_embeddings(model_name)
+    cache = embeddings.document_cache
+
+    report = IngestReport()
+    vector_store: Optional[FAISS] = None
+
+    def add_batch(docs: List[Document], vectors: np.ndarray) -> None:
+        nonlocal vector_store
+        text_embeddings = list(zip([doc.page_content for doc in docs], vectors))
+        metadatas = [doc.metadata for doc in docs]
+        ids = [chunk_id(doc) for doc in docs]
+
+        if vector_store is None:
+            vector_store = FAISS.from_embeddings(
+                text_embeddings, embeddings, metadatas=metadatas, ids=ids
+            )
+        else:
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+        report.chunks += len(docs)
+        report.batches += 1
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(
+                f"Embedded {report.chunks} chunks "
+                f"({report.chunks / elapsed:.1f} chunks/sec)"
+            )
+
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(
+        max_workers,
+        initializer=_init_worker,
+        initargs=(model_name, max_workers),
+    )
+    try:
+        pending = {}
+        for docs in _rebatch(chunk_batches, batch_size):
+            texts = [doc.page_content for doc in docs]
+            vectors = cache.get_many(texts)
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            report.cached += len(docs) - len(missing)
+            if not missing:
+                add_batch(docs, np.stack(vectors))
+                continue
+
+            future = executor.submit(_embed_batch, [texts[i] for i in missing])
+            pending[future] = (docs, vectors, missing)
+            if len(pending) < max_pending:
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                _finish(*pending.pop(future), future.result(), cache, add_batch)
+
+        for future in list(pending):
+            _finish(*pending.pop(future), future.result(), cache, add_batch)
+    finally:
+        # Waiting for the workers also makes their peak RSS visible to getrusage
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    report.seconds = time.perf_counter() - start
+    report.peak_rss_mb = _peak_rss_mb(resource.RUSAGE_SELF)
+    report.peak_worker_rss_mb = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+
+    if vector_store is not None and index_dir is not None:
+        save_vector_store(vector_store, index_dir, embeddings.model_id)
+    return vector_store, report
+
+
+def _rebatch(
+    chunk_batches: Iterable[List[Document]], batch_size: int
+) -> Iterator[List[Document]]:
+    batch: List[Document] = []
+    for docs in chunk_batches:
+        batch.extend(docs)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+
+def _finish(docs, vectors, missing, computed: np.ndarray, cache, add_batch) -> None:
+    cache.put_many([docs[i].page_content for i in missing], computed)
+    for i, vector in zip(missing, computed):
+        vectors[i] = vector
+    add_batch(docs, np.stack(vectors))
+
+
+def _init_worker(model_name: str, num_workers: int) -> None:
+    global _worker_embeddings
+    if not use_hashing_embeddings():
+        import torch
+
+        # Split the cores between workers instead of every worker using all of them
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // num_workers))
+
+    _worker_embeddings, _ = create_embeddings(model_name)
+
+
+def _embed_batch(texts: List[str]) -> np.ndarray:
+    # float32 arrays pickle far smaller than lists of Python floats
+    return np.asarray(_worker_embeddings.embed_documents(texts), dtype=np.float32)
+
+
+def _peak_rss_mb(who: int) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
@@ -1,32 +1,140 @@
 import os
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
 
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.schema import Document
 
+from answer_cache import AnswerCache
+from rag_common.local_models import canned_chat_model_from_env, use_canned_llm
 
-def invoke_llm(query: str, retriever):
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        temperature=0,
-        google_api_key=os.getenv("GOOGLE_API_KEY"),
-    )
-
-    template = """You are a helpful assistant. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise.
+TEMPLATE = """You are a helpful assistant. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise.
     Cite your sources.
     Question: {question}
     Context: {context}
     Answer:"""
 
-    prompt = ChatPromptTemplate.from_template(template)
 
-    chain = (
-        {"context": retriever, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
+def create_llm():
+    if use_canned_llm():
+        return canned_chat_model_from_env()
+
+    # Deferred, so retrieval-only code paths never load the Gemini client
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        temperature=0,
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
     )
 
-    response = chain.invoke(query)
-    return response
+
+@dataclass
+class StreamMetrics:
+    """Per-request timings of a streamed answer, filled in while it is consumed."""
+
+    retrieval_seconds: float = 0.0
+    ttft_seconds: Optional[float] = None
+    generation_seconds: float = 0.0
+    total_seconds: float = 0.0
+    chunks: int = 0
+    cached: bool = False
+
+
+class RAGChain:
+    """Retrieve-and-generate chain that is built once and reused across queries."""
+
+    def __init__(
+        self,
+        retriever,
+        answer_cache: Optional[AnswerCache] = None,
+        index_version: Optional[str] = None,
+    ):
+        self.retriever = retriever
+        self.answer_cache = answer_cache
+        # Cached answers are only valid for the index version they were generated from
+        self.index_version = index_version
+
+        from langchain.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+
+        prompt = ChatPromptTemplate.from_template(TEMPLATE)
+        self.chain = prompt | create_llm() | StrOutputParser()
+
+    def invoke(self, query: str) -> str:
+        if self.answer_cache is not None:
+            response = self.answer_cache.get(query, self.index_version)
+            if response is not None:
+                return response
+
+        docs = self.retriever.invoke(query)
+        response = self.generate(query, docs)
+
+        if self.answer_cache is not None:
+            self.answer_cache.put(query, response, self.index_version)
+        return response
+
+    def generate(self, query: str, docs: List[Document]) -> str:
+        return self.chain.invoke({"context": docs, "question": query})
+
+    def stream(
+        self, query: str, metrics: Optional[StreamMetrics] = None
+    ) -> Iterator[str]:
+        """
+        Yield the answer as Gemini generates it. Timings are written to metrics, the
+        time-to-first-token being measured from the start of the request.
+        """
+        metrics = metrics if metrics is not None else StreamMetrics()
+        start = time.perf_counter()
+
+        if self.answer_cache is not None:
+            response = self.answer_cache.get(query, self.index_version)
+            if response is not None:
+                metrics.cached = True
+                metrics.ttft_seconds = metrics.total_seconds = (
+                    time.perf_counter() - start
+                )
+                metrics.chunks = 1
+                yield response
+                return
+
+        docs = self.retriever.invoke(query)
+        metrics.retrieval_seconds = time.perf_counter() - start
+
+        chunks = []
+        for chunk in self.generate_stream(query, docs, metrics, start):
+            chunks.append(chunk)
+            yield chunk
+
+        if self.answer_cache is not None:
+            self.answer_cache.put(query, "".join(chunks), self.index_version)
+
+    def generate_stream(
+        self,
+        query: str,
+        docs: List[Document],
+        metrics: Optional[StreamMetrics] = None,
+        start: Optional[float] = None,
+    ) -> Iterator[str]:
+        metrics = metrics if metrics is not None else StreamMetrics()
+        start = start if start is not None else time.perf_counter()
+        generate_start = time.perf_counter()
+
+        for chunk in self.chain.stream({"context": docs, "question": query}):
+            if metrics.ttft_seconds is None:
+                metrics.ttft_seconds = time.perf_counter() - start
+            metrics.chunks += 1
+            yield chunk
+
+        metrics.generation_seconds = time.perf_counter() - generate_start
+        metrics.total_seconds = time.perf_counter() - start
+
+
+def invoke_llm(query: str, retriever):
+    return RAGChain(retriever).invoke(query)
+
+
+def stream_llm(
+    query: str, retriever, metrics: Optional[StreamMetrics] = None
+) -> Iterator[str]:
+    return RAGChain(retriever).stream(query, metrics)
@@ -1,31 +1,83 @@
+import argparse
+
 from dotenv import load_dotenv
 
+from bm25 import BM25Index
 from chunking import create_chunks_from_files
-from embed_store import embed_and_store
-from query import query_vector_store
-from llm import invoke_llm
-
+from context import ContextPackingRetriever
+from embed_store import embed_and_store, index_version
+from query import HybridRetriever
 
 load_dotenv()
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--retrieve-only",
+        action="store_true",
+        help="Print the retrieved chunks without calling the LLM",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["faiss", "mmap"],
+        default="faiss",
+        help="mmap: exact search over memory-mapped NumPy arrays, for small corpora",
+    )
+    args = parser.parse_args()
+
     data_dir = "./Big Star Collectibles"
-    file_texts = create_chunks_from_files(data_dir)
+    index_dir = "./faiss_index" if args.backend == "faiss" else "./mmap_index"
+    bm25_path = f"{index_dir}/bm25.json"
+
+    bm25_index = BM25Index.load_or_create(bm25_path)
+    file_texts = create_chunks_from_files(data_dir, bm25_index=bm25_index)
 
-    vector_store = embed_and_store(file_texts)
+    vector_store = embed_and_store(
+        file_texts, index_dir=index_dir, backend=args.backend
+    )
+    bm25_index.save(bm25_path)
     print("Successfully populated vector_store")
+    print(f"Embedding cache: {vector_store.embeddings.stats()}")
 
     query = "What year was Big Star Collectibles Started?"
     query = "I want to join Big Star Collectibles as a E-Commerce Web Developer"
     query = "Tell me about Big Star Collectibles Trading Cards"
-    retriever, _ = query_vector_store(vector_store, query)
+    # Keyword matches catch exact product names. The fused candidates are then packed
+    # into a token budget: diversified with MMR and adjacent chunks merged
+    retriever = ContextPackingRetriever(
+        retriever=HybridRetriever(
+            vector_store=vector_store, bm25_index=bm25_index, k=10
+        ),
+        embeddings=vector_store.embeddings,
+        token_budget=384,
+    )
+
+    if args.retrieve_only:
+        for doc in retriever.invoke(query):
+            print(f"\n[{doc.metadata['doc_title']} #{doc.metadata['chunk_nums']}]")
+            print(doc.page_content)
+        return
 
-    response = invoke_llm(
-        query,
+    # Only the answering path needs the LLM stack
+    from answer_cache import AnswerCache
+    from llm import RAGChain, StreamMetrics
+
+    rag_chain = RAGChain(
         retriever,
+        answer_cache=AnswerCache(vector_store.embeddings),
+        index_version=index_version(vector_store),
+    )
+    # Stream the answer, so it starts printing after the first token, not the last
+    metrics = StreamMetrics()
+    print("\nFinal Response: ", end="", flush=True)
+    for chunk in rag_chain.stream(query, metrics):
+        print(chunk, end="", flush=True)
+    print(
+        f"\n\nretrieval {metrics.retrieval_seconds:.2f}s, "
+        f"time to first token {metrics.ttft_seconds:.2f}s, "
+        f"total {metrics.total_seconds:.2f}s"
     )
-    print(f"\nFinal Response: {response}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain.schema import Document
+
+from chunking import chunk_id
+
+VECTORS_FILE = "vectors.npy"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+METADATA_FILE = "metadata.json"
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_PREFIX = "snapshot-"
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Exact cosine-similarity search over L2-normalized embeddings kept in a .npy file
+    opened with np.memmap. Chunk texts are a single UTF-8 blob plus an offsets array,
+    and metadata is stored column by column, dictionary-encoded into int32 code arrays.
+    Everything is memory-mapped read-only, so loading is near-instant and worker
+    processes share the OS page cache instead of holding private copies.
+
+    Each build is written to a new snapshot directory under `path` and published by
+    swapping the CURRENT pointer, so processes still mapping an older snapshot keep
+    reading complete, unchanged files.
+    """
+
+    def __init__(self, embedding: Embeddings, path: str, block_size: int = 16_384):
+        self.embedding = embedding
+        self.path = path
+        self.block_size = block_size
+
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            self.snapshot = os.path.join(path, f.read().strip())
+        with open(os.path.join(self.snapshot, METADATA_FILE)) as f:
+            sidecar = json.load(f)
+        self.version = sidecar["version"]
+        self.columns = {
+            name: (values, np.load(self._column_file(name), mmap_mode="r"))
+            for name, values in sidecar["columns"].items()
+        }
+
+        self.vectors = np.load(os.path.join(self.snapshot, VECTORS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(self.snapshot, OFFSETS_FILE), mmap_mode="r")
+        texts_path = os.path.join(self.snapshot, TEXTS_FILE)
+        self.texts = (
+            np.memmap(texts_path, dtype=np.uint8, mode="r")
+            if os.path.getsize(texts_path)
+            else np.empty(0, dtype=np.uint8)
+        )
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, CURRENT_FILE))
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @classmethod
+    def build(
+        cls,
+        docs: List[Document],
+        embedding: Embeddings,
+        path: str,
+        vectors: Optional[np.ndarray] = None,
+    ) -> "MmapVectorStore":
+        if not docs:
+            raise ValueError("Cannot build an MmapVectorStore without documents")
+
+        os.makedirs(path, exist_ok=True)
+        previous = cls._current_snapshot(path)
+        # Never written to once published, a fresh directory per build
+        snapshot = tempfile.mkdtemp(prefix=SNAPSHOT_PREFIX, dir=path)
+        if vectors is None:
+            vectors = embedding.embed_documents([doc.page_content for doc in docs])
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(docs), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        store = np.lib.format.open_memmap(
+            os.path.join(snapshot, VECTORS_FILE),
+            mode="w+",
+            dtype=np.float32,
+            shape=vectors.shape,
+        )
+        store[:] = vectors
+        store.flush()
+
+        encoded = [doc.page_content.encode("utf-8") for doc in docs]
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(text) for text in encoded])
+        np.save(os.path.join(snapshot, OFFSETS_FILE), offsets)
+        with open(os.path.join(snapshot, TEXTS_FILE), "wb") as f:
+            for text in encoded:
+                f.write(text)
+
+        # Dictionary-encode each metadata field: distinct values in JSON, int32 codes
+        # per chunk in a .npy file (-1 where the field is missing)
+        names = sorted({name for doc in docs for name in doc.metadata})
+        columns = {}
+        for name in names:
+            values: List[Any] = []
+            lookup = {}
+            codes = np.full(len(docs), -1, dtype=np.int32)
+            for i, doc in enumerate(docs):
+                if name not in doc.metadata:
+                    continue
+                value = doc.metadata[name]
+                key = json.dumps(value, sort_keys=True)
+                if key not in lookup:
+                    lookup[key] = len(values)
+                    values.append(value)
+                codes[i] = lookup[key]
+            np.save(cls._column_file_at(snapshot, name), codes)
+            columns[name] = values
+
+        ids = sorted(chunk_id(doc) for doc in docs)
+        sidecar = {
+            "version": hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16],
+            "columns": columns,
+        }
+        with open(os.path.join(snapshot, METADATA_FILE), "w") as f:
+            json.dump(sidecar, f)
+
+        # Publish the complete snapshot in one rename
+        current_path = os.path.join(path, CURRENT_FILE)
+        with open(f"{current_path}.tmp", "w") as f:
+            f.write(os.path.basename(snapshot))
+        os.replace(f"{current_path}.tmp", current_path)
+
+        # Keep the snapshot just replaced for readers that resolved CURRENT before the
+        # swap but haven't opened its files yet, older ones (and failed builds) go
+        keep = {os.path.basename(snapshot), previous}
+        for name in os.listdir(path):
+            if name.startswith(SNAPSHOT_PREFIX) and name not in keep:
+                # Unlinking is safe for processes mapping the files on POSIX, Windows
+                # refuses while they are open and they are retried on the next build
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        return cls(embedding, path)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        path: str,
+        **kwargs: Any,
+    ) -> "MmapVectorStore":
+        metadatas = metadatas or [{} for _ in texts]
+        docs = [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadatas)
+        ]
+        return cls.build(docs, embedding, path)
+
+    def add_texts(
+        self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs
+    ) -> List[str]:
+        raise NotImplementedError(
+            "MmapVectorStore is a read-only snapshot, rebuild it with MmapVectorStore.build"
+        )
+
+    def get_document(self, i: int) -> Document:
+        text = bytes(self.texts[self.offsets[i] : self.offsets[i + 1]]).decode("utf-8")
+        metadata = {}
+        for name, (values, codes) in self.columns.items():
+            code = int(codes[i])
+            if code >= 0:
+                metadata[name] = values[code]
+        return Document(page_content=text, metadata=metadata)
+
+    def similarity_search_with_score_by_vectors(
+        self, query_vectors: np.ndarray, k: int = 4, query_batch_size: int = 1024
+    ) -> List[List[Tuple[Document, float]]]:
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        # Bounds the score matrix to query_batch_size x block_size floats
+        results = []
+        for start in range(0, len(queries), query_batch_size):
+            results.extend(self._search(queries[start : start + query_batch_size], k))
+        return results
+
+    def _search(
+        self, queries: np.ndarray, k: int
+    ) -> List[List[Tuple[Document, float]]]:
+        num_queries = len(queries)
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in range(num_queries)]
+
+        # Scan the corpus block by block, keeping only each block's top k per query
+        best_scores = np.full((num_queries, 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((num_queries, 0), dtype=np.int64)
+        for start in range(0, len(self), self.block_size):
+            scores = queries @ self.vectors[start : start + self.block_size].T
+            block_k = min(k, scores.shape[1])
+            top = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+
+            best_scores = np.hstack([best_scores, np.take_along_axis(scores, top, 1)])
+            best_ids = np.hstack([best_ids, top + start])
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, 1)
+                best_ids = np.take_along_axis(best_ids, keep, 1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, 1)
+        best_ids = np.take_along_axis(best_ids, order, 1)
+        return [
+            [(self.get_document(i), float(score)) for i, score in zip(ids, scores)]
+            for ids, scores in zip(best_ids.tolist(), best_scores.tolist())
+        ]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vectors(np.array([embedding]), k)[0]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k
+        )
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)
+        ]
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1) / 2
+
+    def _column_file(self, name: str) -> str:
+        return self._column_file_at(self.snapshot, name)
+
+    @staticmethod
+    def _current_snapshot(path: str) -> Optional[str]:
+        try:
+            with open(os.path.join(path, CURRENT_FILE)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _column_file_at(path: str, name: str) -> str:
+        safe_name = "".join(c if c.isalnum() else "_" for c in name)
+        digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(path, f"column_{safe_name}_{digest}.npy")
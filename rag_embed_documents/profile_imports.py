@@ -0,0 +1,67 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+# Line format of `python -X importtime`: "import time: <self us> | <cumulative us> | <module>"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Modules a retrieve-only run should never load
+WATCHED_MODULES = ("langchain_google_genai", "google.generativeai", "PIL", "open_clip")
+
+
+def profile(script: str, script_args, top: int) -> None:
+    # Run from the script's directory, the pipelines import their siblings and use
+    # relative data paths
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.basename(script), *script_args],
+        cwd=os.path.dirname(os.path.abspath(script)),
+        capture_output=True,
+        text=True,
+    )
+
+    self_us = defaultdict(int)
+    cumulative_us = {}
+    loaded = set()
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, module = match.groups()
+        loaded.add(module)
+        package = module.split(".")[0]
+        self_us[package] += int(own)
+        if len(indent) == 1:
+            # Top-level import: its cumulative time covers everything it pulled in
+            cumulative_us[module] = int(cumulative)
+
+    total_ms = sum(self_us.values()) / 1000
+    print(f"Total import time: {total_ms:.0f} ms across {len(loaded)} modules\n")
+
+    print(f"{'package':40} {'self ms':>10}")
+    for package, us in sorted(self_us.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:40} {us / 1000:>10.1f}")
+
+    print(f"\n{'top-level import':40} {'cumulative ms':>14}")
+    for module, us in sorted(cumulative_us.items(), key=lambda item: -item[1])[:top]:
+        print(f"{module:40} {us / 1000:>14.1f}")
+
+    print()
+    for module in WATCHED_MODULES:
+        print(f"{module}: {'loaded' if module in loaded else 'not loaded'}")
+
+    if result.returncode != 0:
+        print(f"\n{script} exited with {result.returncode}:\n{result.stderr[-2000:]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Show per-module import time of a pipeline entry point",
+        epilog="Example: python profile_imports.py main.py --retrieve-only",
+    )
+    parser.add_argument("script")
+    parser.add_argument("--top", type=int, default=20)
+    args, script_args = parser.parse_known_args()
+    profile(args.script, script_args, args.top)
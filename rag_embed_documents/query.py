@@ -1,7 +1,100 @@
+from typing import Dict, List, Tuple
+
+import faiss
+import numpy as np
+from langchain.schema import Document
 from langchain_community.vectorstores import VectorStore
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from bm25 import BM25Index
+from chunking import chunk_id
+from mmap_store import MmapVectorStore
 
 
 def query_vector_store(vector_store: VectorStore, query: str):
     retriever = vector_store.as_retriever(top_k=4)
     docs = retriever.invoke(query)
     return retriever, docs
+
+
+def batch_query_vector_store(
+    vector_store: VectorStore, queries: List[str], k: int = 4
+) -> List[List[Tuple[Document, float]]]:
+    """
+    Search many queries at once: one batched embedding call for all queries and one
+    search over the whole query matrix. Returns the top k (document, score) pairs per
+    query, scored like the store's similarity_search_with_score (L2 distance for FAISS
+    by default, cosine similarity for MmapVectorStore).
+    """
+    if not queries:
+        return []
+
+    # CachedEmbeddings batches queries through its query cache
+    embeddings = vector_store.embeddings
+    embed_queries = getattr(embeddings, "embed_queries", embeddings.embed_documents)
+    query_matrix = np.asarray(embed_queries(queries), dtype=np.float32)
+    if isinstance(vector_store, MmapVectorStore):
+        return vector_store.similarity_search_with_score_by_vectors(query_matrix, k)
+
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(query_matrix)
+
+    scores, indices = vector_store.index.search(query_matrix, k)
+
+    # Resolve every distinct hit once, however many queries returned it
+    docstore_ids = vector_store.index_to_docstore_id
+    docs = {
+        i: vector_store.docstore.search(docstore_ids[i])
+        for i in np.unique(indices)
+        if i != -1  # FAISS pads with -1 when fewer than k vectors match
+    }
+
+    return [
+        [(docs[i], float(score)) for i, score in zip(row_ids, row_scores) if i != -1]
+        for row_ids, row_scores in zip(indices.tolist(), scores.tolist())
+    ]
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Document]], k: int = 4, rrf_k: int = 60
+) -> List[Document]:
+    # Each list contributes 1 / (rrf_k + rank) per document, no score calibration needed
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            doc_id = chunk_id(doc)
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (rrf_k + rank)
+            docs.setdefault(doc_id, doc)
+
+    top = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[doc_id] for doc_id in top]
+
+
+def hybrid_query(
+    vector_store: VectorStore,
+    bm25_index: BM25Index,
+    query: str,
+    k: int = 4,
+    fetch_k: int = 20,
+) -> List[Document]:
+    dense = vector_store.similarity_search(query, k=fetch_k)
+    sparse = [doc for doc, _ in bm25_index.search(query, k=fetch_k)]
+    return reciprocal_rank_fusion([dense, sparse], k=k)
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense FAISS and BM25 keyword retrieval merged with reciprocal rank fusion."""
+
+    vector_store: VectorStore
+    bm25_index: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return hybrid_query(
+            self.vector_store, self.bm25_index, query, k=self.k, fetch_k=self.fetch_k
+        )
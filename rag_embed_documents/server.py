@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Optional
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from answer_cache import AnswerCache
+from chunking import create_chunks_from_files
+from context import ContextPackingRetriever, pack_context
+from embed_store import embed_and_store, index_version
+from llm import RAGChain, StreamMetrics
+from watch import LiveIndex, LockedRetriever
+
+load_dotenv()
+
+DATA_DIR = "./Big Star Collectibles"
+INDEX_DIR = "./faiss_index"
+# Answers are generated from up to FETCH_K chunks packed into TOKEN_BUDGET tokens
+FETCH_K = 10
+TOKEN_BUDGET = 384
+
+# Keys for the state shared by all requests
+VECTOR_STORE = web.AppKey("vector_store")
+RAG_CHAIN = web.AppKey("rag_chain")
+EXECUTOR = web.AppKey("executor")
+WATCH_INTERVAL = web.AppKey("watch_interval")
+LIVE_INDEX = web.AppKey("live_index")
+STOP_WATCHING = web.AppKey("stop_watching")
+
+
+async def on_startup(app: web.Application) -> None:
+    # Model, index and LLM client are loaded once for the lifetime of the service
+    file_texts = create_chunks_from_files(DATA_DIR)
+    vector_store = embed_and_store(file_texts, index_dir=INDEX_DIR)
+
+    app[VECTOR_STORE] = vector_store
+    retriever = vector_store.as_retriever(search_kwargs={"k": FETCH_K})
+
+    if app[WATCH_INTERVAL] is not None:
+        # Edits in DATA_DIR are applied to the live index while requests are served
+        live_index = LiveIndex(
+            vector_store,
+            DATA_DIR,
+            index_dir=INDEX_DIR,
+            # A new version makes answers cached from older content unreachable
+            on_update=lambda version: setattr(app[RAG_CHAIN], "index_version", version),
+        )
+        retriever = LockedRetriever(retriever=retriever, live_index=live_index)
+        app[LIVE_INDEX] = live_index
+
+    app[RAG_CHAIN] = RAGChain(
+        ContextPackingRetriever(
+            retriever=retriever,
+            embeddings=vector_store.embeddings,
+            token_budget=TOKEN_BUDGET,
+        ),
+        answer_cache=AnswerCache(vector_store.embeddings),
+        index_version=index_version(vector_store),
+    )
+
+    if LIVE_INDEX in app:
+        app[STOP_WATCHING] = app[LIVE_INDEX].start(app[WATCH_INTERVAL])
+
+    # Warm up, so the first real request doesn't pay for lazy model initialization
+    start = time.perf_counter()
+    await _run(app, _retrieve, app, "warm up", 1)
+    print(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+
+async def on_cleanup(app: web.Application) -> None:
+    if STOP_WATCHING in app:
+        app[STOP_WATCHING].set()
+    app[EXECUTOR].shutdown(wait=True)
+
+
+async def retrieve(request: web.Request) -> web.Response:
+    query, k = await _parse(request)
+    docs, timings = await _run(request.app, _retrieve, request.app, query, k)
+    return web.json_response({"documents": docs, "timings_ms": timings})
+
+
+async def answer(request: web.Request) -> web.Response:
+    query, k = await _parse(request)
+    app = request.app
+    rag_chain = app[RAG_CHAIN]
+
+    start = time.perf_counter()
+    cached = await _run(app, rag_chain.answer_cache.get, query, rag_chain.index_version)
+    if cached is not None:
+        return web.json_response(
+            {
+                "answer": cached,
+                "cached": True,
+                "timings_ms": {"total": _ms(time.perf_counter() - start)},
+            }
+        )
+
+    docs, timings = await _run(app, _retrieve, app, query, max(k, FETCH_K), True)
+    pack_start = time.perf_counter()
+    docs = await _run(
+        app, pack_context, query, docs, app[VECTOR_STORE].embeddings, TOKEN_BUDGET
+    )
+    timings["pack"] = _ms(time.perf_counter() - pack_start)
+
+    generate_start = time.perf_counter()
+    response = await _run(app, rag_chain.generate, query, docs)
+    timings["generate"] = _ms(time.perf_counter() - generate_start)
+    timings["total"] = _ms(time.perf_counter() - start)
+    await _run(
+        app, rag_chain.answer_cache.put, query, response, rag_chain.index_version
+    )
+
+    return web.json_response(
+        {
+            "answer": response,
+            "cached": False,
+            "sources": [doc.metadata for doc in docs],
+            "timings_ms": timings,
+        }
+    )
+
+
+async def answer_stream(request: web.Request) -> web.StreamResponse:
+    # Newline-delimited JSON: one {"token": ...} line per chunk as Gemini produces it,
+    # then a final {"timings_ms": ...} line
+    query, _ = await _parse(request)
+    app = request.app
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+
+    metrics = StreamMetrics()
+    chunks = app[RAG_CHAIN].stream(query, metrics)
+    while True:
+        chunk = await _run(app, next, chunks, None)
+        if chunk is None:
+            break
+        await response.write(_ndjson({"token": chunk}))
+
+    timings = {
+        "retrieval": _ms(metrics.retrieval_seconds),
+        "ttft": _ms(metrics.ttft_seconds or 0.0),
+        "generate": _ms(metrics.generation_seconds),
+        "total": _ms(metrics.total_seconds),
+    }
+    await response.write(_ndjson({"cached": metrics.cached, "timings_ms": timings}))
+    await response.write_eof()
+    return response
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+def _retrieve(app: web.Application, query: str, k: int, raw: bool = False):
+    vector_store = app[VECTOR_STORE]
+
+    start = time.perf_counter()
+    query_embedding = vector_store.embeddings.embed_query(query)
+    embedded = time.perf_counter()
+    with _search_lock(app):
+        results = vector_store.similarity_search_with_score_by_vector(
+            query_embedding, k=k
+        )
+    searched = time.perf_counter()
+
+    timings = {"embed": _ms(embedded - start), "search": _ms(searched - embedded)}
+    if raw:
+        return [doc for doc, _ in results], timings
+
+    docs = [
+        {
+            "page_content": doc.page_content,
+            "metadata": doc.metadata,
+            "score": float(score),
+        }
+        for doc, score in results
+    ]
+    return docs, timings
+
+
+def _search_lock(app: web.Application):
+    # Only a watched index changes under running searches
+    live_index = app.get(LIVE_INDEX)
+    return live_index.lock.read() if live_index is not None else nullcontext()
+
+
+async def _parse(request: web.Request):
+    try:
+        body = await request.json()
+    except ValueError:  # JSONDecodeError, or UnicodeDecodeError for non-UTF-8 bodies
+        raise web.HTTPBadRequest(reason="Body must be JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(reason="Body must be a JSON object")
+
+    query = body.get("query")
+    if not query or not isinstance(query, str):
+        raise web.HTTPBadRequest(reason="'query' must be a non-empty string")
+    try:
+        k = int(body.get("k", 4))
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(reason="'k' must be an integer")
+    if k < 1:
+        raise web.HTTPBadRequest(reason="'k' must be at least 1")
+    return query, k
+
+
+async def _run(app: web.Application, fn, *args):
+    # Embedding, search and generation block, keep them off the event loop
+    return await asyncio.get_running_loop().run_in_executor(app[EXECUTOR], fn, *args)
+
+
+def _ndjson(data: dict) -> bytes:
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def create_app(
+    workers: int = 8, watch_interval: Optional[float] = None
+) -> web.Application:
+    app = web.Application()
+    app[EXECUTOR] = ThreadPoolExecutor(workers)
+    app[WATCH_INTERVAL] = watch_interval
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.add_routes(
+        [
+            web.post("/retrieve", retrieve),
+            web.post("/answer", answer),
+            web.post("/answer/stream", answer_stream),
+            web.get("/health", health),
+        ]
+    )
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Big Star Collectibles RAG service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Re-index files in the data directory as they are edited, added or removed",
+    )
+    parser.add_argument(
+        "--watch-interval", type=float, default=1.0, help="Seconds between checks"
+    )
+    args = parser.parse_args()
+
+    app = create_app(args.workers, args.watch_interval if args.watch else None)
+    # run_app stops on SIGINT/SIGTERM, letting in-flight requests finish first
+    web.run_app(app, host=args.host, port=args.port)
@@ -0,0 +1,281 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from ann_index import REMOVABLE_INDEX_TYPES, is_removable
+from bm25 import BM25Index
+from chunking import chunk_id, create_text_splitter, file_doc_title, to_documents
+from embed_store import EMBEDDING_MODEL, index_version, save_vector_store
+
+
+class ReadWriteLock:
+    """
+    Any number of concurrent readers, or one writer. A waiting writer holds off new
+    readers, so a steady stream of queries can't starve an index update.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class LiveIndex:
+    """
+    A FAISS store (and optionally a BM25 index) kept in step with the files of a data
+    directory while it is being queried. Changed files are re-chunked and only their
+    new chunks embedded, outside the lock; the write lock is held just long enough to
+    swap vectors in and out, and the index is saved under the read lock. Searches must
+    run under lock.read().
+    """
+
+    def __init__(
+        self,
+        vector_store: FAISS,
+        data_dir: str,
+        bm25_index: Optional[BM25Index] = None,
+        index_dir: Optional[str] = None,
+        model_name: Optional[str] = None,
+        index_type: str = "flat",
+        build_params: Optional[dict] = None,
+        on_update: Optional[Callable[[str], None]] = None,
+    ):
+        if not isinstance(vector_store, FAISS):
+            raise ValueError(
+                "Watch mode needs a FAISS store, mmap stores are read-only"
+            )
+        if not is_removable(vector_store.index):
+            raise ValueError(
+                f"Watch mode needs an index that can remove vectors, one of "
+                f"{REMOVABLE_INDEX_TYPES}"
+            )
+
+        self.vector_store = vector_store
+        self.data_dir = data_dir
+        self.bm25_index = bm25_index
+        self.index_dir = index_dir
+        self.model_name = model_name or getattr(
+            vector_store.embeddings, "model_id", EMBEDDING_MODEL
+        )
+        self.index_type = index_type
+        self.build_params = build_params  # Recorded in the manifest on every save
+        self.on_update = on_update
+        self.lock = ReadWriteLock()
+        self._save_lock = threading.Lock()  # Saves share the read lock with queries
+        self.version = index_version(vector_store)
+        self.text_splitter = create_text_splitter()
+
+        # doc_title -> ids of its chunks currently in the index
+        self.doc_ids: Dict[str, Set[str]] = {}
+        for doc_id in vector_store.index_to_docstore_id.values():
+            doc = vector_store.docstore.search(doc_id)
+            self.doc_ids.setdefault(doc.metadata["doc_title"], set()).add(doc_id)
+
+    def update_files(
+        self, changed: Iterable[str], removed: Iterable[str]
+    ) -> Tuple[int, int]:
+        chunks: Dict[str, Dict[str, Document]] = {}
+        for path in changed:
+            doc_title = file_doc_title(path, self.data_dir)
+            try:
+                with open(path) as f:
+                    texts = self.text_splitter.split_text(f.read())
+            except FileNotFoundError:
+                texts = []  # Deleted again before we got to read it
+            chunks[doc_title] = {
+                chunk_id(doc): doc for doc in to_documents(doc_title, texts)
+            }
+        for path in removed:
+            chunks[file_doc_title(path, self.data_dir)] = {}
+
+        stale_ids, new_docs = [], {}
+        for doc_title, doc_chunks in chunks.items():
+            old_ids = self.doc_ids.get(doc_title, set())
+            stale_ids.extend(old_ids - doc_chunks.keys())
+            new_docs.update(
+                {cid: doc for cid, doc in doc_chunks.items() if cid not in old_ids}
+            )
+        if not stale_ids and not new_docs:
+            return 0, 0
+
+        # The slow part, embedding, happens while queries still run on the old index
+        texts = [doc.page_content for doc in new_docs.values()]
+        vectors = self.vector_store.embeddings.embed_documents(texts) if texts else []
+
+        with self.lock.write():
+            if stale_ids:
+                self.vector_store.delete(ids=stale_ids)
+            if new_docs:
+                self.vector_store.add_embeddings(
+                    zip(texts, vectors),
+                    metadatas=[doc.metadata for doc in new_docs.values()],
+                    ids=list(new_docs),
+                )
+            if self.bm25_index is not None:
+                self.bm25_index.remove(stale_ids)
+                self.bm25_index.add_documents(list(new_docs.values()), list(new_docs))
+
+            for doc_title, doc_chunks in chunks.items():
+                if doc_chunks:
+                    self.doc_ids[doc_title] = set(doc_chunks)
+                else:
+                    self.doc_ids.pop(doc_title, None)
+            self.version = index_version(self.vector_store)
+
+        if self.index_dir is not None:
+            # Writing to disk only reads the index, so queries keep running meanwhile
+            with self._save_lock, self.lock.read():
+                save_vector_store(
+                    self.vector_store,
+                    self.index_dir,
+                    self.model_name,
+                    self.index_type,
+                    self.build_params,
+                )
+                if self.bm25_index is not None:
+                    self.bm25_index.save(os.path.join(self.index_dir, "bm25.json"))
+
+        if self.on_update is not None:
+            self.on_update(self.version)
+        return len(new_docs), len(stale_ids)
+
+    def watch(self, interval: float = 1.0, stop: Optional[threading.Event] = None):
+        for changed, removed in watch_changes(self.data_dir, interval, stop):
+            start = time.perf_counter()
+            try:
+                added, deleted = self.update_files(changed, removed)
+            except Exception as e:
+                print(f"Index update failed ({type(e).__name__}: {e})")
+                continue
+            print(
+                f"Index updated in {time.perf_counter() - start:.2f}s: "
+                f"{added} chunks added, {deleted} removed "
+                f"({len(changed)} files changed, {len(removed)} removed)"
+            )
+
+    def start(self, interval: float = 1.0) -> threading.Event:
+        # Returns the event that stops the watcher thread
+        stop = threading.Event()
+        threading.Thread(
+            target=self.watch, args=(interval, stop), name="index-watcher", daemon=True
+        ).start()
+        return stop
+
+
+class LockedRetriever(BaseRetriever):
+    """Runs a retriever over a LiveIndex store under its read lock."""
+
+    retriever: BaseRetriever
+    live_index: LiveIndex
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ):
+        with self.live_index.lock.read():
+            return self.retriever.invoke(query)
+
+
+def watch_changes(
+    data_dir: str, interval: float = 1.0, stop: Optional[threading.Event] = None
+) -> Iterator[Tuple[Set[str], Set[str]]]:
+    """
+    Yield (changed paths, removed paths) for the files of data_dir as they change.
+    Uses inotify when inotify_simple is installed, polling mtimes otherwise.
+    """
+    stop = stop if stop is not None else threading.Event()
+    try:
+        import inotify_simple  # noqa: F401
+    except ImportError:
+        print(f"inotify_simple not installed, polling {data_dir} every {interval}s")
+        return _poll_changes(data_dir, interval, stop)
+    return _inotify_changes(data_dir, interval, stop)
+
+
+def _inotify_changes(data_dir, interval, stop):
+    from inotify_simple import INotify, flags
+
+    inotify = INotify()
+    inotify.add_watch(
+        data_dir,
+        flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.DELETE,
+    )
+    try:
+        while not stop.is_set():
+            # Collect a burst of events, an editor save is usually several
+            events = inotify.read(timeout=int(interval * 1000), read_delay=100)
+            names = {event.name for event in events if _is_data_file(event.name)}
+            if names:
+                yield _split_existing(data_dir, names)
+    finally:
+        inotify.close()
+
+
+def _poll_changes(data_dir, interval, stop):
+    snapshot = _snapshot(data_dir)
+    while not stop.wait(interval):
+        current = _snapshot(data_dir)
+        names = {
+            name
+            for name in snapshot.keys() | current.keys()
+            if snapshot.get(name) != current.get(name)
+        }
+        snapshot = current
+        if names:
+            yield _split_existing(data_dir, names)
+
+
+def _snapshot(data_dir: str) -> Dict[str, Tuple[int, int]]:
+    snapshot = {}
+    for entry in os.scandir(data_dir):
+        if entry.is_file() and _is_data_file(entry.name):
+            stat = entry.stat()
+            snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def _split_existing(data_dir: str, names: Set[str]) -> Tuple[Set[str], Set[str]]:
+    paths = {os.path.join(data_dir, name) for name in names}
+    changed = {path for path in paths if os.path.isfile(path)}
+    return changed, paths - changed
+
+
+def _is_data_file(name: str) -> bool:
+    # Skip editor swap and backup files
+    return not (name.startswith(".") or name.endswith(("~", ".swp", ".tmp")))
@@ -0,0 +1,154 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from rag_common.image_store import ImageIngestReport, embed_image_files
+
+
+def label_from_filename(path: str) -> str:
+    # ./images/cat_1.jpeg -> cat
+    return os.path.basename(path).split("_")[0].split(".")[0]
+
+
+@dataclass
+class RetrievalEvaluation:
+    k: int
+    labels: List[str]  # Classes, in confusion matrix order
+    query_paths: List[str]  # Readable queries only, in ranked order
+    corpus_paths: List[str]
+    ranked: np.ndarray  # (queries, k) corpus indices, most similar first
+    precision: Dict[str, float]  # Mean precision@k per query class
+    confusion: np.ndarray  # [query class, retrieved class] counts over the top k
+    seconds: float = 0.0
+    embed_report: ImageIngestReport = field(default_factory=ImageIngestReport)
+
+    @property
+    def mean_precision(self) -> float:
+        return float(np.mean(list(self.precision.values()))) if self.precision else 0.0
+
+    def __str__(self) -> str:
+        width = max(len(label) for label in self.labels + ["query"])
+        lines = [
+            f"Evaluated {len(self.query_paths)} queries against "
+            f"{len(self.corpus_paths)} images in {self.seconds:.2f}s "
+            f"(embedding {self.embed_report.embed_seconds:.2f}s, "
+            f"{self.embed_report.cached} from cache, "
+            f"{len(self.embed_report.errors)} unreadable queries skipped)",
+            f"precision@{self.k}: "
+            + ", ".join(f"{label} {p:.3f}" for label, p in self.precision.items())
+            + f", mean {self.mean_precision:.3f}",
+            "confusion (rows: query class, columns: retrieved class):",
+            " " * width + "".join(f" {label:>{width}}" for label in self.labels),
+        ]
+        for label, row in zip(self.labels, self.confusion):
+            lines.append(
+                f"{label:>{width}}" + "".join(f" {count:>{width}}" for count in row)
+            )
+        return "\n".join(lines)
+
+
+def evaluate_retrieval(
+    vector_store: FAISS,
+    query_paths: List[str],
+    k: int = 4,
+    label_fn: Callable[[str], str] = label_from_filename,
+    batch_size: int = 32,
+    max_workers: Optional[int] = None,
+    query_batch_size: int = 1024,
+) -> RetrievalEvaluation:
+    """
+    Rank the whole corpus for every query image with one matrix multiply per block of
+    queries, and score the top k by label. Query images are embedded in batches
+    through the embedding cache, so images already ingested cost no model run; corpus
+    vectors come straight out of the FAISS index. A query never retrieves itself
+    (or a near-duplicate it was merged with at ingest). Query images that fail to
+    load are left out of the ranking and the metrics, see embed_report.errors.
+    """
+    start = time.perf_counter()
+    corpus_docs = [
+        vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+        for i in range(vector_store.index.ntotal)
+    ]
+    corpus_paths = [doc.metadata["source"] for doc in corpus_docs]
+    corpus = _normalize(vector_store.index.reconstruct_n(0, vector_store.index.ntotal))
+
+    embed_report = ImageIngestReport()
+    queries = _normalize(
+        embed_image_files(
+            vector_store.embeddings,
+            query_paths,
+            batch_size=batch_size,
+            max_workers=max_workers,
+            report=embed_report,
+        )
+    )
+    # Unreadable images come back as zero vectors, they would only skew the statistics
+    readable = [
+        i for i, path in enumerate(query_paths) if path not in embed_report.errors
+    ]
+    query_paths = [query_paths[i] for i in readable]
+    queries = queries[readable]
+
+    # Leave-one-out: a query's own entry (and its aliases) are masked from its ranking
+    position = {}
+    for i, doc in enumerate(corpus_docs):
+        for path in [doc.metadata["source"], *doc.metadata.get("aliases", [])]:
+            position[os.path.abspath(path)] = i
+    own = np.array(
+        [position.get(os.path.abspath(path), -1) for path in query_paths],
+        dtype=np.int64,
+    )
+
+    k = min(k, len(corpus_paths) - int((own >= 0).any()))
+    if k < 1:
+        raise ValueError("Not enough indexed images to rank besides the queries")
+
+    ranked = np.empty((len(query_paths), k), dtype=np.int64)
+    for begin in range(0, len(query_paths), query_batch_size):
+        end = begin + query_batch_size
+        scores = queries[begin:end] @ corpus.T
+        rows = np.nonzero(own[begin:end] >= 0)[0]
+        scores[rows, own[begin:end][rows]] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        ranked[begin:end] = np.take_along_axis(top, order, axis=1)
+
+    query_labels = np.array([label_fn(path) for path in query_paths])
+    corpus_labels = np.array([label_fn(path) for path in corpus_paths])
+    labels = sorted(set(query_labels) | set(corpus_labels))
+    index = {label: i for i, label in enumerate(labels)}
+
+    query_ids = np.array([index[label] for label in query_labels], dtype=np.int64)
+    corpus_ids = np.array([index[label] for label in corpus_labels], dtype=np.int64)
+    retrieved_ids = corpus_ids[ranked]
+    confusion = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    np.add.at(confusion, (np.repeat(query_ids, k), retrieved_ids.ravel()), 1)
+
+    hits = (retrieved_ids == query_ids[:, None]).mean(axis=1)
+    precision = {
+        label: float(hits[query_labels == label].mean())
+        for label in labels
+        if (query_labels == label).any()
+    }
+
+    return RetrievalEvaluation(
+        k=k,
+        labels=labels,
+        query_paths=query_paths,
+        corpus_paths=corpus_paths,
+        ranked=ranked,
+        precision=precision,
+        confusion=confusion,
+        seconds=time.perf_counter() - start,
+        embed_report=embed_report,
+    )
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
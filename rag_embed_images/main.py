@@ -1,12 +1,12 @@
-from semantic import emded_images, retrieve_similar_images, retrieve_dog_similar_to_cat
+from rag_common.image_index import index_images
+from semantic import retrieve_similar_images, retrieve_dog_similar_to_cat
 
 
 def main():
-    vector_store = emded_images("./images/*.jpeg")
-    retriever = vector_store.as_retriever()
+    vector_store = index_images("./images/*.jpeg")
 
-    retrieve_similar_images(retriever, "./images/cat_1.jpeg")
-    retrieve_dog_similar_to_cat(retriever)
+    retrieve_similar_images(vector_store, "./images/cat_1.jpeg")
+    print(retrieve_dog_similar_to_cat(vector_store))
 
 
 if __name__ == "__main__":
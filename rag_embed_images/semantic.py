@@ -1,46 +1,35 @@
 import glob
-import base64
 
-from langchain_experimental.open_clip import OpenCLIPEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
-from langchain_core.vectorstores import VectorStoreRetriever, VectorStore
+from langchain_core.vectorstores import VectorStore
 
+from evaluate import evaluate_retrieval, label_from_filename
+from rag_common.image_store import embed_image_file
 
-def encode_image(path):
-    with open(path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
 
+def search_by_image(vector_store: VectorStore, query_image: str, k: int = 4):
+    query_vector = embed_image_file(vector_store.embeddings, query_image)
+    return vector_store.similarity_search_by_vector(query_vector, k=k)
 
-def emded_images(path: str) -> VectorStore:
-    lc_docs = []
-    paths = glob.glob(path, recursive=True)
 
-    for path in paths:
-        doc = Document(
-            page_content=encode_image(path),
-            metadata={"source": path},
-        )
-        lc_docs.append(doc)
-
-    vector_store = FAISS.from_documents(lc_docs, embedding=OpenCLIPEmbeddings())
-    return vector_store
-
-
-def retrieve_dog_similar_to_cat(retriever: VectorStoreRetriever):
+def retrieve_dog_similar_to_cat(vector_store: VectorStore, k: int = 4):
+    # Rank-weighted cat hits (k for the top result down to 1) per dog image
     dog_paths = glob.glob("./images/dog*.jpeg", recursive=True)
-    dog_to_cat = {}
+    evaluation = evaluate_retrieval(vector_store, dog_paths, k=k)
+    print(evaluation)
 
-    for dog_pic in dog_paths:
-        docs = retriever.invoke(encode_image(dog_pic))
-        cats_retrieved = 0
-        for i, doc in enumerate(docs):
-            if "cat" in doc.metadata["source"]:
-                cats_retrieved += 4 - i
-        dog_to_cat[dog_pic] = cats_retrieved
+    retrieved = [label_from_filename(path) for path in evaluation.corpus_paths]
+    dog_to_cat = {}
+    # Unreadable dog images are left out of the evaluation
+    for dog_pic, ranked in zip(evaluation.query_paths, evaluation.ranked):
+        dog_to_cat[dog_pic] = sum(
+            evaluation.k - i
+            for i, doc_index in enumerate(ranked)
+            if retrieved[doc_index] == "cat"
+        )
+    return dog_to_cat
 
 
-def retrieve_similar_images(retriever: VectorStoreRetriever, query_image: str):
-    docs = retriever.invoke(encode_image(query_image), k=4)
+def retrieve_similar_images(vector_store: VectorStore, query_image: str):
+    docs = search_by_image(vector_store, query_image, k=4)
     for doc in docs:
-        print(doc.metadata)
+        print({key: value for key, value in doc.metadata.items() if key != "thumbnail"})
@@ -0,0 +1,31 @@
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Thread-safe limit on how many requests start per minute.
+
+    Request starts are spaced evenly, so a pool of worker threads sharing one limiter
+    stays under the quota without bursting at the start of each minute.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        """
+        Args:
+            requests_per_minute: Allowed request starts per minute, None for no limit.
+        """
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_start = time.monotonic()
+
+    def wait(self) -> None:
+        """Block until the calling thread may start its request."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        time.sleep(start - now)
@@ -1,13 +1,19 @@
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, List, Optional, Tuple, Union
 from datetime import datetime
 
 import pandas as pd
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from config.settings import get_settings
 from timescale_vector import client
 
+from rag_common.embedding_cache import EMBEDDING_CACHE_DIR, EmbeddingCache
+from rag_common.local_models import hashing_embedding, use_hashing_embeddings
+from database.rate_limiter import RateLimiter
+
 
 class VectorStore:
     """A class for managing vector operations and database interactions using Gemini."""
@@ -16,12 +22,22 @@ class VectorStore:
         """Initialize the VectorStore with settings and Timescale Vector client using Gemini."""
         self.settings = get_settings()
 
-        # Configure Gemini
-        genai.configure(api_key=self.settings.google.api_key)
-        self.embedding_model = "models/embedding-001"
-
         # Timescale Vector settings
         self.vector_settings = self.settings.vector_store
+
+        # Configure Gemini, or the offline hashing embedder (RAG_EMBEDDINGS=hashing)
+        self.use_hashing = use_hashing_embeddings()
+        if self.use_hashing:
+            self.embedding_model = (
+                f"hashing/{self.vector_settings.embedding_dimensions}"
+            )
+        else:
+            genai.configure(api_key=self.settings.google.api_key)
+            self.embedding_model = "models/embedding-001"
+        self.embedding_cache = EmbeddingCache(
+            EMBEDDING_CACHE_DIR, f"{self.embedding_model}/retrieval_document"
+        )
+
         self.vec_client = client.Sync(
             self.settings.database.service_url,
             self.vector_settings.table_name,
@@ -31,7 +47,10 @@ class VectorStore:
 
     def get_embedding(self, text: str) -> List[float]:
         """
-        Generate embedding using Gemini for the given text.
+        Generate embedding using Gemini (or the hashing stand-in) for the given text.
+
+        Embeddings are served from the local embedding cache when the same text was
+        embedded before, so re-ingests and repeated searches skip the remote call.
 
         Args:
             text: The input text to generate an embedding for.
@@ -40,6 +59,14 @@ class VectorStore:
             A list of floats representing the embedding.
         """
         text = text.replace("\n", " ")
+        if self.use_hashing:
+            # Cheaper to recompute than to look up
+            return hashing_embedding(text, self.vector_settings.embedding_dimensions)
+
+        cached = self.embedding_cache.get_many([text])[0]
+        if cached is not None:
+            return cached.tolist()
+
         start_time = time.time()
         embedding_response = genai.embed_content(
             model=self.embedding_model,
@@ -48,8 +75,85 @@ class VectorStore:
         )
         elapsed_time = time.time() - start_time
         logging.info(f"Gemini embedding generated in {elapsed_time:.3f} seconds")
+        self.embedding_cache.put_many([text], [embedding_response["embedding"]])
         return embedding_response["embedding"]
 
+    def get_embeddings(
+        self,
+        texts: List[str],
+        batch_size: int = 100,
+        max_workers: int = 4,
+        requests_per_minute: Optional[float] = None,
+        max_retries: int = 3,
+    ) -> List[List[float]]:
+        """
+        Generate embeddings for many texts with batched, concurrent Gemini requests.
+
+        Texts already in the embedding cache are not sent, and repeated texts are sent
+        once. The rest go out in batches of batch_size (one request each) on
+        max_workers threads, with request starts spaced to stay within
+        requests_per_minute. A batch rejected for exceeding the quota is retried with
+        exponential backoff.
+
+        Args:
+            texts: The input texts to generate embeddings for.
+            batch_size: Texts per request, at most 100 for Gemini.
+            max_workers: Requests in flight at once.
+            requests_per_minute: Request quota to stay under, None for no limit.
+            max_retries: Retries of a batch rejected with ResourceExhausted.
+
+        Returns:
+            One embedding per text, in the order of texts.
+        """
+        start_time = time.time()
+        texts = [text.replace("\n", " ") for text in texts]
+        if self.use_hashing:
+            size = self.vector_settings.embedding_dimensions
+            return [hashing_embedding(text, size) for text in texts]
+
+        cached = self.embedding_cache.get_many(texts)
+        embeddings = {
+            text: vector.tolist()
+            for text, vector in zip(texts, cached)
+            if vector is not None
+        }
+        missing = list(dict.fromkeys(t for t in texts if t not in embeddings))
+        batches = [
+            missing[i : i + batch_size] for i in range(0, len(missing), batch_size)
+        ]
+
+        rate_limiter = RateLimiter(requests_per_minute)
+
+        def embed_batch(batch: List[str]) -> List[List[float]]:
+            for attempt in range(max_retries + 1):
+                rate_limiter.wait()
+                try:
+                    response = genai.embed_content(
+                        model=self.embedding_model,
+                        content=batch,
+                        task_type="retrieval_document",
+                    )
+                    break
+                except google_exceptions.ResourceExhausted:
+                    if attempt == max_retries:
+                        raise
+                    time.sleep(2**attempt)
+            # Cached per batch, so an interrupted ingest keeps what it got
+            self.embedding_cache.put_many(batch, response["embedding"])
+            return response["embedding"]
+
+        with ThreadPoolExecutor(max_workers) as executor:
+            for batch, vectors in zip(batches, executor.map(embed_batch, batches)):
+                embeddings.update(zip(batch, vectors))
+
+        elapsed_time = time.time() - start_time
+        logging.info(
+            f"Gemini embeddings for {len(texts)} texts ({len(missing)} embedded in "
+            f"{len(batches)} requests) in {elapsed_time:.3f} seconds, "
+            f"{len(texts) / elapsed_time if elapsed_time else 0.0:.1f} rows/sec"
+        )
+        return [embeddings[text] for text in texts]
+
     def create_tables(self) -> None:
         """Create the necessary tables in the database."""
         self.vec_client.create_tables()
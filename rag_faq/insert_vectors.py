@@ -6,7 +6,7 @@ from timescale_vector.client import uuid_from_time
 
 vec = VectorStore()
 
-df = pd.read_csv("./data/rag_sample_qas_from_kis.csv", sep=";")
+df = pd.read_csv("./data/rag_sample_qas_from_kis.csv")
 
 
 def prepare_record(row):
@@ -14,7 +14,6 @@ def prepare_record(row):
         f"Question: {row['sample_question']}\nAnswer: {row['sample_ground_truth']}"
     )
 
-    embedding = vec.get_emdedding(content)
     return pd.Series(
         {
             "id": str(uuid_from_time(datetime.now())),
@@ -23,12 +22,13 @@ def prepare_record(row):
                 "created_at": datetime.now().isoformat(),
             },
             "contents": content,
-            "embedding": embedding,
         }
     )
 
 
 records_df = df.apply(prepare_record, axis=1)
+# Embedded in bulk, batched requests instead of a round trip per row
+records_df["embedding"] = vec.get_embeddings(records_df["contents"].tolist())
 
 vec.create_tables()
 vec.create_index()
@@ -0,0 +1,169 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from query import create_llm, prompt_func, split_image_text_types
+
+# Rate limits, timeouts and server errors, the failures a retry can fix
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # google.api_core errors carry their HTTP status as code, HTTP clients as status_code
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return status in TRANSIENT_STATUS_CODES
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, in bursts of up to capacity."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens go out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class ItemResult:
+    index: int
+    query: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    wait_seconds: float = 0.0  # Queued behind the concurrency cap
+    retrieval_seconds: float = 0.0
+    generation_seconds: float = 0.0  # Including rate limit waits and retries
+    latency_seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchReport:
+    results: List[ItemResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def failed(self) -> List[ItemResult]:
+        return [result for result in self.results if not result.ok]
+
+    def percentile(self, q: float) -> float:
+        latencies = sorted(result.latency_seconds for result in self.results)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))]
+
+    def __str__(self) -> str:
+        retries = sum(max(result.attempts - 1, 0) for result in self.results)
+        lines = [
+            f"Answered {len(self.results) - len(self.failed)}/{len(self.results)} "
+            f"queries in {self.seconds:.1f}s "
+            f"({len(self.results) / self.seconds if self.seconds else 0.0:.2f}/sec), "
+            f"latency p50 {self.percentile(50):.2f}s p95 {self.percentile(95):.2f}s, "
+            f"{retries} retries"
+        ]
+        lines.extend(
+            f"  failed #{result.index} {result.query!r} after {result.attempts} "
+            f"attempts: {result.error}"
+            for result in self.failed
+        )
+        return "\n".join(lines)
+
+
+async def answer_batch_async(
+    retriever: VectorStoreRetriever,
+    queries: List[str],
+    llm=None,
+    concurrency: int = 8,
+    requests_per_second: Optional[float] = None,
+    burst: Optional[float] = None,
+    max_retries: int = 3,
+    backoff_seconds: float = 1.0,
+    retry_on: Callable[[Exception], bool] = is_transient,
+) -> BatchReport:
+    """
+    Answer many queries with one chat model client, at most concurrency of them in
+    flight. LLM calls are spaced by a token bucket when requests_per_second is set, and
+    a call failing with an error retry_on accepts (by default rate limits, timeouts and
+    server errors) is retried up to max_retries times with exponential backoff and
+    jitter. Results keep the order of queries; failures are reported, not raised.
+    """
+    chain = RunnableLambda(prompt_func) | (llm or create_llm()) | StrOutputParser()
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(requests_per_second, burst) if requests_per_second else None
+
+    async def answer(index: int, query: str) -> ItemResult:
+        result = ItemResult(index, query)
+        queued = time.perf_counter()
+        async with semaphore:
+            start = time.perf_counter()
+            result.wait_seconds = start - queued
+            try:
+                docs = await retriever.ainvoke(query)
+                # Thumbnail cache misses read and resize images, off the event loop
+                context = await asyncio.to_thread(split_image_text_types, docs)
+            except Exception as e:
+                result.error = f"retrieval: {type(e).__name__}: {e}"
+                result.latency_seconds = time.perf_counter() - start
+                return result
+            result.retrieval_seconds = time.perf_counter() - start
+
+            generate_start = time.perf_counter()
+            for attempt in range(max_retries + 1):
+                result.attempts = attempt + 1
+                if bucket is not None:
+                    await bucket.acquire()
+                try:
+                    result.answer = await chain.ainvoke(
+                        {"context": context, "question": query}
+                    )
+                    result.error = None
+                    break
+                except Exception as e:
+                    result.error = f"{type(e).__name__}: {e}"
+                    if not retry_on(e):
+                        break  # Auth or invalid-argument errors fail every time
+                    if attempt < max_retries:
+                        await asyncio.sleep(
+                            backoff_seconds * 2**attempt * random.uniform(0.5, 1.5)
+                        )
+            result.generation_seconds = time.perf_counter() - generate_start
+            result.latency_seconds = time.perf_counter() - start
+        return result
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(answer(index, query) for index, query in enumerate(queries))
+    )
+    return BatchReport(list(results), time.perf_counter() - start)
+
+
+def answer_batch(retriever: VectorStoreRetriever, queries: List[str], **kwargs):
+    # For callers outside an event loop, see answer_batch_async for kwargs
+    return asyncio.run(answer_batch_async(retriever, queries, **kwargs))
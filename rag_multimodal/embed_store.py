@@ -1,27 +1,9 @@
-import glob
-import base64
-
-from langchain_experimental.open_clip import OpenCLIPEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
 from langchain_core.vectorstores import VectorStore
 
+from rag_common.image_index import index_images
+from thumbnail_cache import default_cache
 
-def encode_image(path):
-    with open(path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-
-
-def emded_images(path: str) -> VectorStore:
-    lc_docs = []
-    paths = glob.glob(path, recursive=True)
-
-    for path in paths:
-        doc = Document(
-            page_content=encode_image(path),
-            metadata={"source": path},
-        )
-        lc_docs.append(doc)
 
-    vector_store = FAISS.from_documents(lc_docs, embedding=OpenCLIPEmbeddings())
-    return vector_store
+def emded_images(path: str, **kwargs) -> VectorStore:
+    # Prompt thumbnails are rendered from the same decode, see query.py
+    return index_images(path, thumbnail_cache=default_cache(), **kwargs)
@@ -9,4 +9,8 @@ def main():
     vector_store = emded_images("../rag_embed_images/images/*.jpeg")
     retriever = vector_store.as_retriever()
 
-    invoke_llm(retriever)
+    print(invoke_llm(retriever))
+
+
+if __name__ == "__main__":
+    main()
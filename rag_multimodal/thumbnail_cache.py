@@ -0,0 +1,134 @@
+import base64
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+from typing import Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from rag_common.image_store import load_image_bytes
+
+THUMBNAIL_CACHE_DIR = "./.thumbnail_cache"
+# Sizes rendered at ingest; PROMPT_SIZE is what prompt_func sends to the LLM
+THUMBNAIL_SIZES = ((128, 128),)
+PROMPT_SIZE = (128, 128)
+
+Size = Tuple[int, int]
+
+
+class ThumbnailCache:
+    """
+    Content-addressed store of JPEG thumbnails, one file per (image sha256, size) on
+    disk with an LRU tier of base64 strings in memory. Thumbnails are rendered once at
+    ingest, so building a prompt is a dictionary or file lookup.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = THUMBNAIL_CACHE_DIR,
+        sizes: Sequence[Size] = THUMBNAIL_SIZES,
+        memory_entries: int = 256,
+    ):
+        self.cache_dir = cache_dir
+        self.sizes = [tuple(size) for size in sizes]
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str, size: Size) -> Optional[str]:
+        key = (digest, tuple(size))
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        path = self._path(digest, size)
+        if not os.path.exists(path):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with open(path, "rb") as f:
+            thumbnail = base64.b64encode(f.read()).decode("utf-8")
+        with self._lock:
+            self.hits += 1
+        self._remember(key, thumbnail)
+        return thumbnail
+
+    def put(self, digest: str, size: Size, data: bytes) -> None:
+        path = self._path(digest, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Content-addressed, so an existing file already holds the same thumbnail
+        if not os.path.exists(path):
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(data)
+            os.replace(f"{path}.tmp", path)
+        self._remember((digest, tuple(size)), base64.b64encode(data).decode("utf-8"))
+
+    def render(self, img, digest: str) -> dict:
+        # Called from ingest threads with the decoded image; only missing sizes are drawn
+        sizes = [s for s in self.sizes if not os.path.exists(self._path(digest, s))]
+        return render_thumbnails(img, sizes) if sizes else {}
+
+    def get_or_render(self, doc: Document, size: Size = PROMPT_SIZE) -> str:
+        # Images ingested before the cache existed are rendered on first use
+        digest = doc.metadata["sha256"]
+        thumbnail = self.get(digest, size)
+        if thumbnail is None:
+            self.put(digest, size, render_thumbnail(load_image_bytes(doc), size))
+            thumbnail = self.get(digest, size)
+        return thumbnail
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _remember(self, key: tuple, thumbnail: str) -> None:
+        with self._lock:
+            self._memory[key] = thumbnail
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, digest: str, size: Size) -> str:
+        width, height = size
+        return os.path.join(
+            self.cache_dir, digest[:2], f"{digest}_{width}x{height}.jpg"
+        )
+
+
+def render_thumbnail(data: bytes, size: Size) -> bytes:
+    from PIL import Image  # Deferred, only needed when rendering
+
+    img = Image.open(BytesIO(data))
+    img.draft("RGB", size)
+    return render_thumbnails(img.convert("RGB"), [size])[tuple(size)]
+
+
+def render_thumbnails(img, sizes: Sequence[Size]) -> dict:
+    """JPEG thumbnails of a decoded RGB image, largest first so each resize is cheap."""
+    from PIL import Image
+
+    thumbnails = {}
+    img = img.copy()
+    for size in sorted((tuple(size) for size in sizes), reverse=True):
+        img.thumbnail(size, Image.LANCZOS)
+        buffered = BytesIO()
+        img.save(buffered, format="JPEG", quality=85)
+        thumbnails[size] = buffered.getvalue()
+    return thumbnails
+
+
+@lru_cache(maxsize=None)
+def default_cache() -> ThumbnailCache:
+    return ThumbnailCache()